@@ -0,0 +1,47 @@
+/* Background import of an uploaded CSV file into a dataset. Rows are inserted and committed in chunks, after each
+   of which `offset` is advanced, so that an interrupted job can resume from the last committed chunk. */
+CREATE TABLE import_job (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    dataset INTEGER NOT NULL,
+    /* One of 'queued', 'running', 'cancelling', 'cancelled', 'done' or 'failed'. */
+    status TEXT NOT NULL,
+    error TEXT,
+    /* Path of the spooled upload, which is removed once the job has ended. */
+    path TEXT NOT NULL,
+    /* ImportOptions as a JSON object. */
+    options TEXT NOT NULL,
+    /* Size of the upload, and the end of the last committed row within it, in bytes. */
+    size INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    malformed INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    /* Transactions categorised by rules once all rows have been imported. */
+    matched INTEGER,
+    /* Seconds since the epoch. */
+    created INTEGER NOT NULL,
+    started INTEGER,
+    updated INTEGER,
+    FOREIGN KEY (dataset) REFERENCES dataset (id)
+);
+
+CREATE INDEX import_job_status ON import_job (status);
+
+INSERT INTO data_version (name, version, modified) VALUES ('import_job', 0, CAST(strftime('%s', 'now') AS INTEGER));
+
+CREATE TRIGGER import_job_version_insert AFTER INSERT ON import_job
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'import_job';
+END;
+
+CREATE TRIGGER import_job_version_update AFTER UPDATE ON import_job
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'import_job';
+END;
+
+CREATE TRIGGER import_job_version_delete AFTER DELETE ON import_job
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'import_job';
+END;
+
+UPDATE eucalyptus SET version = 10 WHERE app = 'money';
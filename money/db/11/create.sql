@@ -0,0 +1,514 @@
+CREATE TABLE eucalyptus (
+    app TEXT NOT NULL PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+INSERT INTO eucalyptus (app, version) VALUES ('money', 11);
+
+CREATE TABLE setting (
+    name TEXT NOT NULL PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+INSERT INTO setting VALUES ('name', '');
+
+CREATE TABLE dataset_source (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    comment TEXT NOT NULL
+);
+
+CREATE TABLE dataset (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    source INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    created DATETIME NOT NULL,
+    FOREIGN KEY (source) REFERENCES dataset_source (id)
+);
+
+CREATE TABLE category (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    comment TEXT NOT NULL,
+    set_start INTEGER NOT NULL,
+    set_end INTEGER NOT NULL
+);
+
+CREATE TABLE tag (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    comment TEXT NOT NULL
+);
+
+CREATE TABLE txn (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    dataset INTEGER NOT NULL,
+    raw TEXT NOT NULL,
+    comment TEXT NOT NULL,
+    malformed BOOLEAN NOT NULL,
+    /* Seconds since the epoch. If timestamp cannot be extracted/parsed, use insertion time. */
+    timestamp INTEGER NOT NULL,
+    /* If description cannot be extracted/parsed, use empty string. */
+    description TEXT NOT NULL,
+    /* If amount cannot be extracted/parsed, use zero. */
+    amount INTEGER NOT NULL,
+    /* Hash identifying the same bank transaction across overlapping imports; NULL for malformed rows. */
+    fingerprint INTEGER,
+    /* UTC calendar buckets of the timestamp as integers, e.g. 20200131 and 202001. */
+    day INTEGER NOT NULL GENERATED ALWAYS AS (CAST(strftime('%Y%m%d', timestamp, 'unixepoch') AS INTEGER)) VIRTUAL,
+    year_month INTEGER NOT NULL GENERATED ALWAYS AS (CAST(strftime('%Y%m', timestamp, 'unixepoch') AS INTEGER)) VIRTUAL,
+    FOREIGN KEY (dataset) REFERENCES dataset (id)
+);
+
+CREATE TABLE txn_part (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    txn INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    /* Combined amount for all parts of a single transaction can be different from transaction amount. */
+    amount INTEGER NOT NULL,
+    category INTEGER,
+    FOREIGN KEY (txn) REFERENCES txn (id),
+    FOREIGN KEY (category) REFERENCES category (id) ON DELETE SET NULL
+);
+
+CREATE TABLE txn_part_tag (
+    txn_part INTEGER NOT NULL,
+    tag INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    PRIMARY KEY (txn_part, tag),
+    FOREIGN KEY (txn_part) REFERENCES txn_part (id),
+    FOREIGN KEY (tag) REFERENCES tag (id)
+);
+
+CREATE INDEX txn_dataset ON txn (dataset);
+CREATE INDEX txn_timestamp ON txn (timestamp, id);
+CREATE INDEX txn_fingerprint ON txn (fingerprint);
+CREATE INDEX txn_day ON txn (day);
+CREATE INDEX txn_year_month ON txn (year_month);
+/* Covers the grouping of parts by transaction in transaction listings. */
+CREATE INDEX txn_part_txn ON txn_part (txn, category, amount);
+/* Covers category filters and the per-category analysis. */
+CREATE INDEX txn_part_category ON txn_part (category, txn, amount);
+CREATE INDEX txn_part_tag_tag ON txn_part_tag (tag, txn_part);
+
+/* Daily totals (by txn.day) of positive part amounts, kept up to date by the triggers below. Uncategorised parts use
+   category 0. */
+CREATE TABLE txn_rollup_category (
+    day INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+) WITHOUT ROWID;
+
+/* Same as txn_rollup_category, but split further by tag. A part with several tags is counted once per tag. */
+CREATE TABLE txn_rollup_tag (
+    day INTEGER NOT NULL,
+    tag INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (day, tag, category)
+) WITHOUT ROWID;
+
+CREATE TRIGGER txn_part_rollup_insert AFTER INSERT ON txn_part WHEN NEW.amount > 0
+BEGIN
+    INSERT INTO txn_rollup_category (day, category, amount)
+    SELECT day, IFNULL(NEW.category, 0), NEW.amount FROM txn WHERE id = NEW.txn
+    ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER txn_part_rollup_update AFTER UPDATE OF txn, amount, category ON txn_part
+BEGIN
+    UPDATE txn_rollup_category SET amount = amount - OLD.amount
+    WHERE OLD.amount > 0
+        AND day = (SELECT day FROM txn WHERE id = OLD.txn)
+        AND category = IFNULL(OLD.category, 0);
+    UPDATE txn_rollup_tag SET amount = amount - OLD.amount
+    WHERE OLD.amount > 0
+        AND day = (SELECT day FROM txn WHERE id = OLD.txn)
+        AND tag IN (SELECT tag FROM txn_part_tag WHERE txn_part = OLD.id)
+        AND category = IFNULL(OLD.category, 0);
+    INSERT INTO txn_rollup_category (day, category, amount)
+    SELECT day, IFNULL(NEW.category, 0), NEW.amount FROM txn WHERE NEW.amount > 0 AND id = NEW.txn
+    ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount;
+    INSERT INTO txn_rollup_tag (day, tag, category, amount)
+    SELECT txn.day, txn_part_tag.tag, IFNULL(NEW.category, 0), NEW.amount
+    FROM txn_part_tag, txn WHERE NEW.amount > 0 AND txn_part_tag.txn_part = NEW.id AND txn.id = NEW.txn
+    ON CONFLICT (day, tag, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER txn_part_rollup_delete AFTER DELETE ON txn_part WHEN OLD.amount > 0
+BEGIN
+    UPDATE txn_rollup_category SET amount = amount - OLD.amount
+    WHERE day = (SELECT day FROM txn WHERE id = OLD.txn)
+        AND category = IFNULL(OLD.category, 0);
+    UPDATE txn_rollup_tag SET amount = amount - OLD.amount
+    WHERE day = (SELECT day FROM txn WHERE id = OLD.txn)
+        AND tag IN (SELECT tag FROM txn_part_tag WHERE txn_part = OLD.id)
+        AND category = IFNULL(OLD.category, 0);
+END;
+
+CREATE TRIGGER txn_part_tag_rollup_insert AFTER INSERT ON txn_part_tag
+BEGIN
+    INSERT INTO txn_rollup_tag (day, tag, category, amount)
+    SELECT txn.day, NEW.tag, IFNULL(txn_part.category, 0), txn_part.amount
+    FROM txn_part, txn WHERE txn_part.id = NEW.txn_part AND txn_part.amount > 0 AND txn.id = txn_part.txn
+    ON CONFLICT (day, tag, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER txn_part_tag_rollup_delete AFTER DELETE ON txn_part_tag
+BEGIN
+    UPDATE txn_rollup_tag SET amount = amount - (
+        SELECT txn_part.amount FROM txn_part WHERE txn_part.id = OLD.txn_part
+    )
+    WHERE tag = OLD.tag AND (day, category) = (
+        SELECT txn.day, IFNULL(txn_part.category, 0)
+        FROM txn_part, txn WHERE txn_part.id = OLD.txn_part AND txn_part.amount > 0 AND txn.id = txn_part.txn
+    );
+END;
+
+CREATE TRIGGER txn_rollup_timestamp AFTER UPDATE OF timestamp ON txn
+WHEN OLD.day IS NOT NEW.day
+BEGIN
+    UPDATE txn_rollup_category SET amount = amount - (
+        SELECT SUM(amount) FROM txn_part
+        WHERE txn = OLD.id AND amount > 0 AND IFNULL(category, 0) = txn_rollup_category.category
+    )
+    WHERE day = OLD.day
+        AND category IN (SELECT IFNULL(category, 0) FROM txn_part WHERE txn = OLD.id AND amount > 0);
+    UPDATE txn_rollup_tag SET amount = amount - (
+        SELECT SUM(txn_part.amount) FROM txn_part, txn_part_tag
+        WHERE txn_part.txn = OLD.id AND txn_part.amount > 0 AND txn_part_tag.txn_part = txn_part.id
+            AND txn_part_tag.tag = txn_rollup_tag.tag AND IFNULL(txn_part.category, 0) = txn_rollup_tag.category
+    )
+    WHERE day = OLD.day
+        AND (tag, category) IN (
+            SELECT txn_part_tag.tag, IFNULL(txn_part.category, 0) FROM txn_part, txn_part_tag
+            WHERE txn_part.txn = OLD.id AND txn_part.amount > 0 AND txn_part_tag.txn_part = txn_part.id
+        );
+    INSERT INTO txn_rollup_category (day, category, amount)
+    SELECT NEW.day, IFNULL(category, 0), SUM(amount) FROM txn_part
+    WHERE txn = NEW.id AND amount > 0
+    GROUP BY IFNULL(category, 0)
+    ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount;
+    INSERT INTO txn_rollup_tag (day, tag, category, amount)
+    SELECT NEW.day, txn_part_tag.tag, IFNULL(txn_part.category, 0), SUM(txn_part.amount)
+    FROM txn_part, txn_part_tag
+    WHERE txn_part.txn = NEW.id AND txn_part.amount > 0 AND txn_part_tag.txn_part = txn_part.id
+    GROUP BY txn_part_tag.tag, IFNULL(txn_part.category, 0)
+    ON CONFLICT (day, tag, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+/* Boundary lookups for inserting and moving categories, and for finding the ancestors or descendants of one. */
+CREATE INDEX category_set_start ON category (set_start, set_end);
+CREATE INDEX category_set_end ON category (set_end);
+
+/* Full-text index of transaction descriptions and comments, kept in sync with txn by the triggers below. */
+CREATE VIRTUAL TABLE txn_search USING fts5 (
+    description,
+    comment,
+    content = 'txn',
+    content_rowid = 'id',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER txn_search_insert AFTER INSERT ON txn
+BEGIN
+    INSERT INTO txn_search (rowid, description, comment) VALUES (NEW.id, NEW.description, NEW.comment);
+END;
+
+CREATE TRIGGER txn_search_delete AFTER DELETE ON txn
+BEGIN
+    INSERT INTO txn_search (txn_search, rowid, description, comment) VALUES ('delete', OLD.id, OLD.description, OLD.comment);
+END;
+
+CREATE TRIGGER txn_search_update AFTER UPDATE OF description, comment ON txn
+BEGIN
+    INSERT INTO txn_search (txn_search, rowid, description, comment) VALUES ('delete', OLD.id, OLD.description, OLD.comment);
+    INSERT INTO txn_search (rowid, description, comment) VALUES (NEW.id, NEW.description, NEW.comment);
+END;
+
+/* Case-insensitive prefix lookups for autocompletion. */
+CREATE INDEX category_name_nocase ON category (name COLLATE NOCASE);
+CREATE INDEX tag_name_nocase ON tag (name COLLATE NOCASE);
+
+/* Rules assign a category and tags to uncategorised parts of matching transactions. All conditions of a rule must
+   match; a NULL condition matches anything. The first matching rule by ID wins. */
+CREATE TABLE rule (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    comment TEXT NOT NULL,
+    /* Matched case-insensitively anywhere in the description. */
+    description_substring TEXT,
+    /* Python regular expression searched for in the description. */
+    description_pattern TEXT,
+    /* Inclusive bounds on the transaction amount. */
+    amount_min INTEGER,
+    amount_max INTEGER,
+    source INTEGER,
+    category INTEGER,
+    FOREIGN KEY (source) REFERENCES dataset_source (id),
+    FOREIGN KEY (category) REFERENCES category (id) ON DELETE SET NULL
+);
+
+CREATE TABLE rule_tag (
+    rule INTEGER NOT NULL,
+    tag INTEGER NOT NULL,
+    PRIMARY KEY (rule, tag),
+    FOREIGN KEY (rule) REFERENCES rule (id),
+    FOREIGN KEY (tag) REFERENCES tag (id)
+) WITHOUT ROWID;
+
+/* Version of the contents of each table, incremented by every statement (per row) that changes them. Used for ETags
+   of, and caching of data derived from, the tables. `modified` is the time of the last change in seconds since the
+   epoch. */
+CREATE TABLE data_version (
+    name TEXT NOT NULL PRIMARY KEY,
+    version INTEGER NOT NULL,
+    modified INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO data_version (name, version, modified) VALUES
+    ('setting', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('dataset_source', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('dataset', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('category', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('tag', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('txn', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('txn_part', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('txn_part_tag', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('rule', 0, CAST(strftime('%s', 'now') AS INTEGER)),
+    ('rule_tag', 0, CAST(strftime('%s', 'now') AS INTEGER));
+
+CREATE TRIGGER setting_version_insert AFTER INSERT ON setting
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'setting';
+END;
+
+CREATE TRIGGER setting_version_update AFTER UPDATE ON setting
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'setting';
+END;
+
+CREATE TRIGGER setting_version_delete AFTER DELETE ON setting
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'setting';
+END;
+
+CREATE TRIGGER dataset_source_version_insert AFTER INSERT ON dataset_source
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'dataset_source';
+END;
+
+CREATE TRIGGER dataset_source_version_update AFTER UPDATE ON dataset_source
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'dataset_source';
+END;
+
+CREATE TRIGGER dataset_source_version_delete AFTER DELETE ON dataset_source
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'dataset_source';
+END;
+
+CREATE TRIGGER dataset_version_insert AFTER INSERT ON dataset
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'dataset';
+END;
+
+CREATE TRIGGER dataset_version_update AFTER UPDATE ON dataset
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'dataset';
+END;
+
+CREATE TRIGGER dataset_version_delete AFTER DELETE ON dataset
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'dataset';
+END;
+
+CREATE TRIGGER category_version_insert AFTER INSERT ON category
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'category';
+END;
+
+CREATE TRIGGER category_version_update AFTER UPDATE ON category
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'category';
+END;
+
+CREATE TRIGGER category_version_delete AFTER DELETE ON category
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'category';
+END;
+
+CREATE TRIGGER tag_version_insert AFTER INSERT ON tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'tag';
+END;
+
+CREATE TRIGGER tag_version_update AFTER UPDATE ON tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'tag';
+END;
+
+CREATE TRIGGER tag_version_delete AFTER DELETE ON tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'tag';
+END;
+
+CREATE TRIGGER txn_version_insert AFTER INSERT ON txn
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn';
+END;
+
+CREATE TRIGGER txn_version_update AFTER UPDATE ON txn
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn';
+END;
+
+CREATE TRIGGER txn_version_delete AFTER DELETE ON txn
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn';
+END;
+
+CREATE TRIGGER txn_part_version_insert AFTER INSERT ON txn_part
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn_part';
+END;
+
+CREATE TRIGGER txn_part_version_update AFTER UPDATE ON txn_part
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn_part';
+END;
+
+CREATE TRIGGER txn_part_version_delete AFTER DELETE ON txn_part
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn_part';
+END;
+
+CREATE TRIGGER txn_part_tag_version_insert AFTER INSERT ON txn_part_tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn_part_tag';
+END;
+
+CREATE TRIGGER txn_part_tag_version_update AFTER UPDATE ON txn_part_tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn_part_tag';
+END;
+
+CREATE TRIGGER txn_part_tag_version_delete AFTER DELETE ON txn_part_tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'txn_part_tag';
+END;
+
+CREATE TRIGGER rule_version_insert AFTER INSERT ON rule
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'rule';
+END;
+
+CREATE TRIGGER rule_version_update AFTER UPDATE ON rule
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'rule';
+END;
+
+CREATE TRIGGER rule_version_delete AFTER DELETE ON rule
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'rule';
+END;
+
+CREATE TRIGGER rule_tag_version_insert AFTER INSERT ON rule_tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'rule_tag';
+END;
+
+CREATE TRIGGER rule_tag_version_update AFTER UPDATE ON rule_tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'rule_tag';
+END;
+
+CREATE TRIGGER rule_tag_version_delete AFTER DELETE ON rule_tag
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'rule_tag';
+END;
+
+/* Background import of an uploaded CSV file into a dataset. Rows are inserted and committed in chunks, after each
+   of which `offset` is advanced, so that an interrupted job can resume from the last committed chunk. */
+CREATE TABLE import_job (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    dataset INTEGER NOT NULL,
+    /* One of 'queued', 'running', 'cancelling', 'cancelled', 'done' or 'failed'. */
+    status TEXT NOT NULL,
+    error TEXT,
+    /* Path of the spooled upload, which is removed once the job has ended. */
+    path TEXT NOT NULL,
+    /* ImportOptions as a JSON object. */
+    options TEXT NOT NULL,
+    /* Size of the upload, and the end of the last committed row within it, in bytes. */
+    size INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    malformed INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    /* Transactions categorised by rules once all rows have been imported. */
+    matched INTEGER,
+    /* Seconds since the epoch. */
+    created INTEGER NOT NULL,
+    started INTEGER,
+    updated INTEGER,
+    FOREIGN KEY (dataset) REFERENCES dataset (id)
+);
+
+CREATE INDEX import_job_status ON import_job (status);
+
+INSERT INTO data_version (name, version, modified) VALUES ('import_job', 0, CAST(strftime('%s', 'now') AS INTEGER));
+
+CREATE TRIGGER import_job_version_insert AFTER INSERT ON import_job
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'import_job';
+END;
+
+CREATE TRIGGER import_job_version_update AFTER UPDATE ON import_job
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'import_job';
+END;
+
+CREATE TRIGGER import_job_version_delete AFTER DELETE ON import_job
+BEGIN
+    UPDATE data_version SET version = version + 1, modified = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'import_job';
+END;
+
+/* Transaction parts that have been changed or deleted, or whose transaction or tags have been changed, in the order of
+   the changes. In-memory copies of the parts (i.e. the analytics engine) re-read just these to catch up, along with the
+   parts inserted since, which have greater IDs than any they have loaded. Only about the latest 100000 changes are
+   kept; copies that are further behind are reloaded entirely. */
+CREATE TABLE txn_part_change (
+    seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    txn_part INTEGER NOT NULL
+);
+
+CREATE TRIGGER txn_part_change_update AFTER UPDATE OF txn, amount, category ON txn_part
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER txn_part_change_delete AFTER DELETE ON txn_part
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER txn_part_change_txn_update AFTER UPDATE OF dataset, timestamp ON txn
+BEGIN
+    INSERT INTO txn_part_change (txn_part) SELECT id FROM txn_part WHERE txn = NEW.id;
+END;
+
+CREATE TRIGGER txn_part_change_tag_insert AFTER INSERT ON txn_part_tag
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (NEW.txn_part);
+END;
+
+CREATE TRIGGER txn_part_change_tag_delete AFTER DELETE ON txn_part_tag
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (OLD.txn_part);
+END;
+
+CREATE TRIGGER txn_part_change_prune AFTER INSERT ON txn_part_change WHEN NEW.seq % 1000 = 0
+BEGIN
+    DELETE FROM txn_part_change WHERE seq <= NEW.seq - 100000;
+END;
@@ -0,0 +1,40 @@
+/* Transaction parts that have been changed or deleted, or whose transaction or tags have been changed, in the order of
+   the changes. In-memory copies of the parts (i.e. the analytics engine) re-read just these to catch up, along with the
+   parts inserted since, which have greater IDs than any they have loaded. Only about the latest 100000 changes are
+   kept; copies that are further behind are reloaded entirely. */
+CREATE TABLE txn_part_change (
+    seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    txn_part INTEGER NOT NULL
+);
+
+CREATE TRIGGER txn_part_change_update AFTER UPDATE OF txn, amount, category ON txn_part
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER txn_part_change_delete AFTER DELETE ON txn_part
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER txn_part_change_txn_update AFTER UPDATE OF dataset, timestamp ON txn
+BEGIN
+    INSERT INTO txn_part_change (txn_part) SELECT id FROM txn_part WHERE txn = NEW.id;
+END;
+
+CREATE TRIGGER txn_part_change_tag_insert AFTER INSERT ON txn_part_tag
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (NEW.txn_part);
+END;
+
+CREATE TRIGGER txn_part_change_tag_delete AFTER DELETE ON txn_part_tag
+BEGIN
+    INSERT INTO txn_part_change (txn_part) VALUES (OLD.txn_part);
+END;
+
+CREATE TRIGGER txn_part_change_prune AFTER INSERT ON txn_part_change WHEN NEW.seq % 1000 = 0
+BEGIN
+    DELETE FROM txn_part_change WHERE seq <= NEW.seq - 100000;
+END;
+
+UPDATE eucalyptus SET version = 11 WHERE app = 'money';
@@ -0,0 +1,6 @@
+/* Lets the dataset filter of the transaction listing read a dataset's transactions in (timestamp, id) order, so that
+   pages are a range of the index instead of a sort of all of the dataset's transactions. */
+DROP INDEX txn_dataset;
+CREATE INDEX txn_dataset ON txn (dataset, timestamp, id);
+
+UPDATE eucalyptus SET version = 12 WHERE app = 'money';
@@ -0,0 +1,6 @@
+/* Lets several server processes resume import jobs without running the same job twice: a job is claimed by the
+   process that runs it, and can only be taken over once that process has stopped renewing its lease. */
+ALTER TABLE import_job ADD COLUMN owner TEXT;
+ALTER TABLE import_job ADD COLUMN lease_until INTEGER;
+
+UPDATE eucalyptus SET version = 13 WHERE app = 'money';
@@ -0,0 +1,9 @@
+CREATE INDEX txn_dataset ON txn (dataset);
+CREATE INDEX txn_timestamp ON txn (timestamp, id);
+/* Covers the grouping of parts by transaction in transaction listings. */
+CREATE INDEX txn_part_txn ON txn_part (txn, category, amount);
+/* Covers category filters and the per-category analysis. */
+CREATE INDEX txn_part_category ON txn_part (category, txn, amount);
+CREATE INDEX txn_part_tag_tag ON txn_part_tag (tag, txn_part);
+
+UPDATE eucalyptus SET version = 2 WHERE app = 'money';
@@ -0,0 +1,190 @@
+CREATE TABLE eucalyptus (
+    app TEXT NOT NULL PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+INSERT INTO eucalyptus (app, version) VALUES ('money', 3);
+
+CREATE TABLE setting (
+    name TEXT NOT NULL PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+INSERT INTO setting VALUES ('name', '');
+
+CREATE TABLE dataset_source (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    comment TEXT NOT NULL
+);
+
+CREATE TABLE dataset (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    source INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    created DATETIME NOT NULL,
+    FOREIGN KEY (source) REFERENCES dataset_source (id)
+);
+
+CREATE TABLE category (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    comment TEXT NOT NULL,
+    set_start INTEGER NOT NULL,
+    set_end INTEGER NOT NULL
+);
+
+CREATE TABLE tag (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    comment TEXT NOT NULL
+);
+
+CREATE TABLE txn (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    dataset INTEGER NOT NULL,
+    raw TEXT NOT NULL,
+    comment TEXT NOT NULL,
+    malformed BOOLEAN NOT NULL,
+    /* If timestamp cannot be extracted/parsed, use insertion time. */
+    timestamp DATETIME NOT NULL,
+    /* If description cannot be extracted/parsed, use empty string. */
+    description TEXT NOT NULL,
+    /* If amount cannot be extracted/parsed, use zero. */
+    amount INTEGER NOT NULL,
+    FOREIGN KEY (dataset) REFERENCES dataset (id)
+);
+
+CREATE TABLE txn_part (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    txn INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    /* Combined amount for all parts of a single transaction can be different from transaction amount. */
+    amount INTEGER NOT NULL,
+    category INTEGER,
+    FOREIGN KEY (txn) REFERENCES txn (id),
+    FOREIGN KEY (category) REFERENCES category (id) ON DELETE SET NULL
+);
+
+CREATE TABLE txn_part_tag (
+    txn_part INTEGER NOT NULL,
+    tag INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    PRIMARY KEY (txn_part, tag),
+    FOREIGN KEY (txn_part) REFERENCES txn_part (id),
+    FOREIGN KEY (tag) REFERENCES tag (id)
+);
+
+CREATE INDEX txn_dataset ON txn (dataset);
+CREATE INDEX txn_timestamp ON txn (timestamp, id);
+/* Covers the grouping of parts by transaction in transaction listings. */
+CREATE INDEX txn_part_txn ON txn_part (txn, category, amount);
+/* Covers category filters and the per-category analysis. */
+CREATE INDEX txn_part_category ON txn_part (category, txn, amount);
+CREATE INDEX txn_part_tag_tag ON txn_part_tag (tag, txn_part);
+
+/* Daily totals of positive part amounts, kept up to date by the triggers below. Uncategorised parts use category 0. */
+CREATE TABLE txn_rollup_category (
+    day TEXT NOT NULL,
+    category INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+) WITHOUT ROWID;
+
+/* Same as txn_rollup_category, but split further by tag. A part with several tags is counted once per tag. */
+CREATE TABLE txn_rollup_tag (
+    day TEXT NOT NULL,
+    tag INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (day, tag, category)
+) WITHOUT ROWID;
+
+CREATE TRIGGER txn_part_rollup_insert AFTER INSERT ON txn_part WHEN NEW.amount > 0
+BEGIN
+    INSERT INTO txn_rollup_category (day, category, amount)
+    SELECT strftime('%Y-%m-%d', timestamp), IFNULL(NEW.category, 0), NEW.amount FROM txn WHERE id = NEW.txn
+    ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER txn_part_rollup_update AFTER UPDATE OF txn, amount, category ON txn_part
+BEGIN
+    UPDATE txn_rollup_category SET amount = amount - OLD.amount
+    WHERE OLD.amount > 0
+        AND day = (SELECT strftime('%Y-%m-%d', timestamp) FROM txn WHERE id = OLD.txn)
+        AND category = IFNULL(OLD.category, 0);
+    UPDATE txn_rollup_tag SET amount = amount - OLD.amount
+    WHERE OLD.amount > 0
+        AND day = (SELECT strftime('%Y-%m-%d', timestamp) FROM txn WHERE id = OLD.txn)
+        AND tag IN (SELECT tag FROM txn_part_tag WHERE txn_part = OLD.id)
+        AND category = IFNULL(OLD.category, 0);
+    INSERT INTO txn_rollup_category (day, category, amount)
+    SELECT strftime('%Y-%m-%d', timestamp), IFNULL(NEW.category, 0), NEW.amount FROM txn WHERE NEW.amount > 0 AND id = NEW.txn
+    ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount;
+    INSERT INTO txn_rollup_tag (day, tag, category, amount)
+    SELECT strftime('%Y-%m-%d', txn.timestamp), txn_part_tag.tag, IFNULL(NEW.category, 0), NEW.amount
+    FROM txn_part_tag, txn WHERE NEW.amount > 0 AND txn_part_tag.txn_part = NEW.id AND txn.id = NEW.txn
+    ON CONFLICT (day, tag, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER txn_part_rollup_delete AFTER DELETE ON txn_part WHEN OLD.amount > 0
+BEGIN
+    UPDATE txn_rollup_category SET amount = amount - OLD.amount
+    WHERE day = (SELECT strftime('%Y-%m-%d', timestamp) FROM txn WHERE id = OLD.txn)
+        AND category = IFNULL(OLD.category, 0);
+    UPDATE txn_rollup_tag SET amount = amount - OLD.amount
+    WHERE day = (SELECT strftime('%Y-%m-%d', timestamp) FROM txn WHERE id = OLD.txn)
+        AND tag IN (SELECT tag FROM txn_part_tag WHERE txn_part = OLD.id)
+        AND category = IFNULL(OLD.category, 0);
+END;
+
+CREATE TRIGGER txn_part_tag_rollup_insert AFTER INSERT ON txn_part_tag
+BEGIN
+    INSERT INTO txn_rollup_tag (day, tag, category, amount)
+    SELECT strftime('%Y-%m-%d', txn.timestamp), NEW.tag, IFNULL(txn_part.category, 0), txn_part.amount
+    FROM txn_part, txn WHERE txn_part.id = NEW.txn_part AND txn_part.amount > 0 AND txn.id = txn_part.txn
+    ON CONFLICT (day, tag, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
+
+CREATE TRIGGER txn_part_tag_rollup_delete AFTER DELETE ON txn_part_tag
+BEGIN
+    UPDATE txn_rollup_tag SET amount = amount - (
+        SELECT txn_part.amount FROM txn_part WHERE txn_part.id = OLD.txn_part
+    )
+    WHERE tag = OLD.tag AND (day, category) = (
+        SELECT strftime('%Y-%m-%d', txn.timestamp), IFNULL(txn_part.category, 0)
+        FROM txn_part, txn WHERE txn_part.id = OLD.txn_part AND txn_part.amount > 0 AND txn.id = txn_part.txn
+    );
+END;
+
+CREATE TRIGGER txn_rollup_timestamp AFTER UPDATE OF timestamp ON txn
+WHEN strftime('%Y-%m-%d', OLD.timestamp) IS NOT strftime('%Y-%m-%d', NEW.timestamp)
+BEGIN
+    UPDATE txn_rollup_category SET amount = amount - (
+        SELECT SUM(amount) FROM txn_part
+        WHERE txn = OLD.id AND amount > 0 AND IFNULL(category, 0) = txn_rollup_category.category
+    )
+    WHERE day = strftime('%Y-%m-%d', OLD.timestamp)
+        AND category IN (SELECT IFNULL(category, 0) FROM txn_part WHERE txn = OLD.id AND amount > 0);
+    UPDATE txn_rollup_tag SET amount = amount - (
+        SELECT SUM(txn_part.amount) FROM txn_part, txn_part_tag
+        WHERE txn_part.txn = OLD.id AND txn_part.amount > 0 AND txn_part_tag.txn_part = txn_part.id
+            AND txn_part_tag.tag = txn_rollup_tag.tag AND IFNULL(txn_part.category, 0) = txn_rollup_tag.category
+    )
+    WHERE day = strftime('%Y-%m-%d', OLD.timestamp)
+        AND (tag, category) IN (
+            SELECT txn_part_tag.tag, IFNULL(txn_part.category, 0) FROM txn_part, txn_part_tag
+            WHERE txn_part.txn = OLD.id AND txn_part.amount > 0 AND txn_part_tag.txn_part = txn_part.id
+        );
+    INSERT INTO txn_rollup_category (day, category, amount)
+    SELECT strftime('%Y-%m-%d', NEW.timestamp), IFNULL(category, 0), SUM(amount) FROM txn_part
+    WHERE txn = NEW.id AND amount > 0
+    GROUP BY IFNULL(category, 0)
+    ON CONFLICT (day, category) DO UPDATE SET amount = amount + excluded.amount;
+    INSERT INTO txn_rollup_tag (day, tag, category, amount)
+    SELECT strftime('%Y-%m-%d', NEW.timestamp), txn_part_tag.tag, IFNULL(txn_part.category, 0), SUM(txn_part.amount)
+    FROM txn_part, txn_part_tag
+    WHERE txn_part.txn = NEW.id AND txn_part.amount > 0 AND txn_part_tag.txn_part = txn_part.id
+    GROUP BY txn_part_tag.tag, IFNULL(txn_part.category, 0)
+    ON CONFLICT (day, tag, category) DO UPDATE SET amount = amount + excluded.amount;
+END;
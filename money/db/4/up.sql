@@ -0,0 +1,5 @@
+/* Boundary lookups for inserting and moving categories, and for finding the ancestors or descendants of one. */
+CREATE INDEX category_set_start ON category (set_start, set_end);
+CREATE INDEX category_set_end ON category (set_end);
+
+UPDATE eucalyptus SET version = 4 WHERE app = 'money';
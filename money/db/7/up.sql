@@ -0,0 +1,29 @@
+/* Hash identifying the same bank transaction across overlapping imports; NULL for malformed rows. */
+ALTER TABLE txn ADD COLUMN fingerprint INTEGER;
+
+/* Repeats of an identical row within a dataset are told apart by their position among the repeats. */
+CREATE TEMP TABLE txn_occurrence (
+    id INTEGER NOT NULL PRIMARY KEY,
+    occurrence INTEGER NOT NULL
+);
+
+INSERT INTO txn_occurrence (id, occurrence)
+SELECT id, ROW_NUMBER() OVER (PARTITION BY dataset, timestamp, amount, description ORDER BY id) - 1 AS occurrence
+FROM txn
+WHERE NOT malformed;
+
+/* txn_fingerprint is registered by the server before migrating. */
+UPDATE txn SET fingerprint = txn_fingerprint(
+    (SELECT source FROM dataset WHERE id = txn.dataset),
+    CAST(strftime('%s', timestamp) AS INTEGER),
+    amount,
+    description,
+    (SELECT occurrence FROM txn_occurrence WHERE id = txn.id)
+)
+WHERE NOT malformed;
+
+DROP TABLE txn_occurrence;
+
+CREATE INDEX txn_fingerprint ON txn (fingerprint);
+
+UPDATE eucalyptus SET version = 7 WHERE app = 'money';
@@ -0,0 +1,331 @@
+from datetime import datetime
+from os import getenv
+from threading import Lock
+from typing import Optional, List, Dict, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from server.api._common import connect
+from server.cache import table_versions, TableVersion
+
+# Set to 1 to answer analysis queries from arrays held in memory instead of SQLite. Requires numpy; without it, the
+# setting is ignored.
+ANALYTICS_ENGINE_ENABLED = getenv('EUCALYPTUS_ANALYTICS_ENGINE') == '1' and np is not None
+
+# Above this fraction of the parts changed since the snapshot, it's reloaded rather than updated.
+MAX_CHANGED_FRACTION = 0.25
+
+# Tables that the snapshot is derived from.
+SNAPSHOT_TABLES = ('txn', 'txn_part', 'txn_part_tag')
+
+# numpy datetime64 units, and so also the formats of the labels, of each time unit.
+_TIME_UNITS = {
+    'year': 'Y',
+    'month': 'M',
+    'day': 'D',
+}
+
+_PARTS_QUERY = """
+    SELECT txn_part.id, txn.timestamp, txn_part.amount, IFNULL(txn_part.category, 0), txn.dataset
+    FROM txn_part
+    JOIN txn ON txn.id = txn_part.txn
+"""
+
+
+class Snapshot:
+    """
+    Every transaction part as columns, in the order of their IDs: the timestamp of its transaction in seconds since the
+    epoch, its amount in cents, its category (0 if uncategorised), the dataset of its transaction, and a bitset of its
+    tags. `change` is the last entry of the change log that it includes.
+    """
+
+    def __init__(self, part, timestamp, amount, category, dataset, tag_bits: Dict[int, int], tags, change: int):
+        self.part = part
+        self.timestamp = timestamp
+        self.amount = amount
+        self.category = category
+        self.dataset = dataset
+        self.tag_bits = tag_bits
+        self.tags = tags
+        self.change = change
+
+    @classmethod
+    def load(cls, c, change: int) -> 'Snapshot':
+        c.execute(_PARTS_QUERY + " ORDER BY txn_part.id")
+        part, timestamp, amount, category, dataset = _columns(c.fetchall())
+        c.execute("SELECT txn_part, tag FROM txn_part_tag")
+        tag_bits: Dict[int, int] = {}
+        tags = _tag_words(part, c.fetchall(), tag_bits)
+        return cls(part, timestamp, amount, category, dataset, tag_bits, tags, change)
+
+    def updated(self, c, change: int) -> 'Snapshot':
+        """
+        Returns a copy with the parts inserted since this snapshot, and those changed according to the change log since
+        `self.change`, re-read.
+        """
+        last_part = int(self.part[-1]) if self.part.size else 0
+        c.execute(
+            _PARTS_QUERY + """
+                WHERE txn_part.id > ? OR txn_part.id IN (SELECT txn_part FROM txn_part_change WHERE seq > ?)
+                ORDER BY txn_part.id
+            """,
+            (last_part, self.change)
+        )
+        part, timestamp, amount, category, dataset = _columns(c.fetchall())
+        c.execute(
+            """
+                SELECT txn_part, tag FROM txn_part_tag
+                WHERE txn_part > ? OR txn_part IN (SELECT txn_part FROM txn_part_change WHERE seq > ?)
+            """,
+            (last_part, self.change)
+        )
+        tag_bits = dict(self.tag_bits)
+        tags = _tag_words(part, c.fetchall(), tag_bits)
+
+        # Drop the old versions of changed parts, including deleted ones, which the query above didn't return.
+        c.execute("SELECT DISTINCT txn_part FROM txn_part_change WHERE seq > ?", (self.change,))
+        changed = np.fromiter((p for p, in c.fetchall()), dtype=np.int64)
+        keep = ~np.isin(self.part, changed)
+
+        old_tags = self.tags[keep]
+        width = max(old_tags.shape[1], tags.shape[1])
+        merged = [
+            np.concatenate((old[keep], new))
+            for old, new in zip(
+                (self.part, self.timestamp, self.amount, self.category, self.dataset),
+                (part, timestamp, amount, category, dataset),
+            )
+        ]
+        merged.append(np.concatenate((_widen(old_tags, width), _widen(tags, width))))
+        if part.size and keep.any() and part[0] < self.part[keep][-1]:
+            # Changed parts were re-read, so they're out of order; parts that were only inserted come after the rest.
+            order = np.argsort(merged[0], kind='stable')
+            merged = [column[order] for column in merged]
+        part, timestamp, amount, category, dataset, tags = merged
+        return Snapshot(part, timestamp, amount, category, dataset, tag_bits, tags, change)
+
+    def tagged_with_any(self, tags: List[int]):
+        words = np.zeros(self.tags.shape[1], dtype=np.uint64)
+        for tag in tags:
+            bit = self.tag_bits.get(tag)
+            if bit is not None:
+                words[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+        return (self.tags & words).any(axis=1)
+
+    def select(
+            self,
+            *,
+            dt_from: Optional[datetime],
+            dt_to: Optional[datetime],
+            dataset: Optional[int] = None,
+            categories: Optional[Set[int]],
+            tags: List[int],
+    ):
+        """
+        Returns a mask of the parts matching the filters, like those of the transaction listing.
+        """
+        mask = np.ones(self.part.size, dtype=bool)
+        if dt_from is not None:
+            mask &= self.timestamp >= int(dt_from.timestamp())
+        if dt_to is not None:
+            mask &= self.timestamp <= int(dt_to.timestamp())
+        if dataset is not None:
+            mask &= self.dataset == dataset
+        if categories is not None:
+            mask &= np.isin(self.category, np.fromiter(categories, dtype=np.int32, count=len(categories)))
+        if tags:
+            mask &= self.tagged_with_any(tags)
+        return mask
+
+
+def _columns(rows: List[Tuple]):
+    count = len(rows)
+    return (
+        np.fromiter((r[0] for r in rows), dtype=np.int64, count=count),
+        np.fromiter((r[1] for r in rows), dtype=np.int64, count=count),
+        np.fromiter((r[2] for r in rows), dtype=np.int64, count=count),
+        np.fromiter((r[3] for r in rows), dtype=np.int32, count=count),
+        np.fromiter((r[4] for r in rows), dtype=np.int32, count=count),
+    )
+
+
+def _tag_words(part, tagged: List[Tuple[int, int]], tag_bits: Dict[int, int]):
+    """
+    Returns the tag bitsets of the parts with the IDs `part` (sorted), from (part, tag) pairs. Each tag in use gets a
+    bit, which is added to `tag_bits`; parts have one 64-bit word per 64 tags.
+    """
+    for _, tag in tagged:
+        tag_bits.setdefault(tag, len(tag_bits))
+    count = part.size
+    tags = np.zeros((count, max(1, (len(tag_bits) + 63) // 64)), dtype=np.uint64)
+    if tagged:
+        tagged_parts = np.fromiter((p for p, _ in tagged), dtype=np.int64, count=len(tagged))
+        bits = np.fromiter((tag_bits[t] for _, t in tagged), dtype=np.int64, count=len(tagged))
+        rows = np.searchsorted(part, tagged_parts)
+        # Leave out tags of parts that no longer exist.
+        found = rows < count
+        found[found] = part[rows[found]] == tagged_parts[found]
+        np.bitwise_or.at(
+            tags,
+            (rows[found], bits[found] // 64),
+            np.left_shift(np.uint64(1), (bits[found] % 64).astype(np.uint64)),
+        )
+    return tags
+
+
+def _widen(tags, width: int):
+    if tags.shape[1] == width:
+        return tags
+    return np.concatenate((tags, np.zeros((tags.shape[0], width - tags.shape[1]), dtype=np.uint64)), axis=1)
+
+
+def _group(key):
+    """
+    Returns the start of each run of equal values of the sorted `key`.
+    """
+    if not key.size:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+
+
+class AnalyticsEngine:
+    """
+    Answers /transactions/analysis and /transactions/trend queries from a Snapshot. On the first query after the
+    transactions, their parts or their tags have changed (according to their data versions), the snapshot is brought up
+    to date from the parts inserted since and the change log, or reloaded if too much has changed.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._db = None
+        self._versions: Optional[Dict[str, TableVersion]] = None
+        self._snapshot: Optional[Snapshot] = None
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            if self._db is None:
+                self._db = connect()
+            c = self._db.cursor()
+            # Everything is read from the same snapshot of the database.
+            c.execute("BEGIN")
+            try:
+                versions = table_versions(c, SNAPSHOT_TABLES)
+                if self._snapshot is None or versions != self._versions:
+                    self._snapshot = self._refresh(c)
+                    self._versions = versions
+            finally:
+                self._db.rollback()
+            return self._snapshot
+
+    def _refresh(self, c) -> Snapshot:
+        first, last = c.execute("SELECT IFNULL(MIN(seq), 0), IFNULL(MAX(seq), 0) FROM txn_part_change").fetchone()
+        s = self._snapshot
+        # Changes after the snapshot that have been pruned from the log can't be caught up with.
+        if s is None or first > s.change + 1:
+            return Snapshot.load(c, last)
+        c.execute("SELECT COUNT(DISTINCT txn_part) FROM txn_part_change WHERE seq > ?", (s.change,))
+        changed = c.fetchone()[0]
+        if changed > MAX_CHANGED_FRACTION * s.part.size:
+            return Snapshot.load(c, last)
+        return s.updated(c, last)
+
+    def analyse(
+            self,
+            *,
+            dt_from: Optional[datetime],
+            dt_to: Optional[datetime],
+            split_by_category: bool,
+            time_unit: str,
+            categories: Optional[Set[int]],
+            tags: List[int],
+    ) -> List[Dict]:
+        """
+        Sums positive part amounts, optionally per category and/or time unit. Returns rows with `combined_amount`, and
+        `category_id` (None if uncategorised) and `time_unit` (formatted like SQLite's strftime) when grouped by them.
+        """
+        s = self.snapshot()
+        mask = s.select(dt_from=dt_from, dt_to=dt_to, categories=categories, tags=tags)
+        mask &= s.amount > 0
+
+        amount = s.amount[mask]
+        if not split_by_category and time_unit == 'none':
+            return [{"combined_amount": int(amount.sum()) if amount.size else None}]
+
+        # Group by a single int64 key: the time unit in the high bits and the category in the low 32.
+        key = np.zeros(amount.size, dtype=np.int64)
+        if time_unit != 'none':
+            units = s.timestamp[mask].astype('datetime64[s]').astype(f'datetime64[{_TIME_UNITS[time_unit]}]')
+            key += units.astype(np.int64) << 32
+        if split_by_category:
+            key += s.category[mask]
+
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        starts = _group(key)
+        sums = np.add.reduceat(amount[order], starts) if key.size else np.zeros(0, dtype=np.int64)
+        group_keys = key[starts]
+
+        rows = [{"combined_amount": int(total)} for total in sums]
+        if split_by_category:
+            for row, category in zip(rows, (group_keys & 0xFFFFFFFF).tolist()):
+                row["category_id"] = category or None
+        if time_unit != 'none':
+            units = (group_keys >> 32).astype(f'datetime64[{_TIME_UNITS[time_unit]}]')
+            for row, label in zip(rows, np.datetime_as_string(units).tolist()):
+                row["time_unit"] = label
+        return rows
+
+    def trend(
+            self,
+            *,
+            dt_from: Optional[datetime],
+            dt_to: Optional[datetime],
+            dataset: Optional[int],
+            categories: Optional[Set[int]],
+            tags: List[int],
+            time_unit: str,
+            window: int,
+    ) -> List[Dict]:
+        """
+        Sums part amounts per time unit, in order, along with windows over the time units that have any parts: the
+        running balance since the first, the average of the last `window` (fewer at the start), and the change from the
+        previous one (None for the first).
+        """
+        s = self.snapshot()
+        mask = s.select(dt_from=dt_from, dt_to=dt_to, dataset=dataset, categories=categories, tags=tags)
+        unit = _TIME_UNITS[time_unit]
+        units = s.timestamp[mask].astype('datetime64[s]').astype(f'datetime64[{unit}]').astype(np.int64)
+        order = np.argsort(units, kind='stable')
+        units = units[order]
+        starts = _group(units)
+        if not starts.size:
+            return []
+        amounts = np.add.reduceat(s.amount[mask][order], starts)
+
+        balance = np.cumsum(amounts)
+        # Sums of the windows are differences of the running balance.
+        before_window = np.r_[0, balance][np.maximum(np.arange(amounts.size) - window + 1, 0)]
+        moving_average = (balance - before_window) / np.minimum(np.arange(1, amounts.size + 1), window)
+        change = np.r_[0, np.diff(amounts)]
+
+        labels = np.datetime_as_string(units[starts].astype(f'datetime64[{unit}]')).tolist()
+        rows = [
+            {
+                "time_unit": label,
+                "amount": amount,
+                "balance": total,
+                "moving_average": average,
+                "change": delta,
+            }
+            for label, amount, total, average, delta in zip(
+                labels, amounts.tolist(), balance.tolist(), moving_average.tolist(), change.tolist()
+            )
+        ]
+        rows[0]["change"] = None
+        return rows
+
+
+engine = AnalyticsEngine() if ANALYTICS_ENGINE_ENABLED else None
@@ -0,0 +1,108 @@
+"""
+Compares the analytics engine with the SQL queries it replaces, on a generated database:
+
+    python -m server.analytics_benchmark [transactions]
+
+Requires numpy.
+"""
+
+import os
+import random
+import sqlite3
+import sys
+from tempfile import mkdtemp
+from time import perf_counter
+
+# The database is chosen when the server modules are imported.
+os.environ['EUCALYPTUS_DB'] = os.path.join(mkdtemp(), 'benchmark.sqlite')
+
+from server import analytics
+from server.main import server
+
+QUERIES = (
+    '/transactions/analysis?split_by=category&time_unit=month',
+    '/transactions/analysis?split_by=none&time_unit=day&from=1514764800',
+    '/transactions/analysis?split_by=category_tree&time_unit=none&tag=1',
+    '/transactions/trend?time_unit=month&window=3',
+    '/transactions/trend?time_unit=day&window=30&category=2',
+)
+REPEATS = 5
+
+
+def _populate(db: sqlite3.Connection, client, transactions: int):
+    rng = random.Random(1)
+    root = client.post('/categories', json={'name': 'root', 'mode': 'root'}).get_json()['id']
+    categories = [
+        client.post('/categories', json={'name': f'c{i}', 'mode': 'first', 'target': root}).get_json()['id']
+        for i in range(20)
+    ]
+    for i in range(5):
+        client.post('/tags', json={'name': f't{i}', 'comment': ''})
+    db.execute("INSERT INTO dataset_source (name, comment) VALUES ('bank', '')")
+    db.execute("INSERT INTO dataset (source, comment, created) VALUES (1, '', 0)")
+    _insert(db, rng, categories, transactions)
+    db.execute("INSERT INTO txn_part_tag (txn_part, tag, comment) SELECT id, id % 5 + 1, '' FROM txn_part WHERE id % 7 = 0")
+    db.commit()
+    return rng, categories
+
+
+def _insert(db: sqlite3.Connection, rng: random.Random, categories, transactions: int):
+    first = db.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM txn").fetchone()[0]
+    db.executemany(
+        "INSERT INTO txn (dataset, raw, comment, malformed, timestamp, description, amount) VALUES (1, '', '', 0, ?, ?, ?)",
+        (
+            (rng.randint(1420070400, 1600000000), f'Shop {rng.randint(1, 500)}', rng.randint(-5000, 5000))
+            for _ in range(transactions)
+        )
+    )
+    db.execute(
+        "INSERT INTO txn_part (txn, comment, amount, category) SELECT id, '', amount, ? + id % ? FROM txn WHERE id >= ?",
+        (categories[0], len(categories), first)
+    )
+
+
+def _time(client, url: str) -> float:
+    client.get(url)
+    start = perf_counter()
+    for _ in range(REPEATS):
+        res = client.get(url)
+        assert res.status_code == 200, res.status_code
+    return (perf_counter() - start) / REPEATS
+
+
+def main():
+    if analytics.np is None:
+        sys.exit('The analytics engine requires numpy')
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    client = server.test_client()
+    db = sqlite3.connect(os.environ['EUCALYPTUS_DB'])
+    rng, categories = _populate(db, client, transactions)
+    print(f'{transactions} transactions')
+
+    engine = analytics.AnalyticsEngine()
+    start = perf_counter()
+    engine.snapshot()
+    print(f'snapshot load: {(perf_counter() - start) * 1000:.0f} ms')
+
+    for url in QUERIES:
+        analytics.engine = None
+        sql = _time(client, url)
+        analytics.engine = engine
+        in_memory = _time(client, url)
+        print(f'{url}: SQL {sql * 1000:.1f} ms, engine {in_memory * 1000:.1f} ms')
+
+    _insert(db, rng, categories, 1000)
+    db.commit()
+    start = perf_counter()
+    engine.snapshot()
+    print(f'refresh after inserting 1000 transactions: {(perf_counter() - start) * 1000:.1f} ms')
+
+    db.execute("UPDATE txn_part SET category = ? WHERE id % 1000 = 0", (categories[1],))
+    db.commit()
+    start = perf_counter()
+    engine.snapshot()
+    print(f'refresh after changing the category of 0.1% of parts: {(perf_counter() - start) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
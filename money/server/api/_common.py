@@ -1,13 +1,204 @@
+import json
 import sqlite3
+from contextlib import contextmanager
 from os import getenv
+from queue import Queue, Empty
+from threading import Lock
+from typing import Iterable, Dict, Optional, Tuple, Sequence, Callable
 
-from flask import g
+from flask import g, Response, request
+
+from server.instrumentation import connection_factory
 
 DATABASE = getenv('EUCALYPTUS_DB')
+# Maximum number of connections per process serving read-only requests.
+DATABASE_READERS = int(getenv('EUCALYPTUS_DB_READERS', '4'))
+
+READ_ONLY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Shared encoder for streamed responses; rows never contain cycles, so skip the check for them.
+_encode_json = json.JSONEncoder(check_circular=False, separators=(',', ':')).encode
+
+
+def connect():
+    db = sqlite3.connect(DATABASE, check_same_thread=False, cached_statements=256, factory=connection_factory())
+    # WAL lets readers continue while a write (e.g. a large import) is in progress.
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    # Negative values are in KiB, so this is 64 MiB.
+    db.execute("PRAGMA cache_size = -65536")
+    db.execute("PRAGMA mmap_size = 268435456")
+    db.execute("PRAGMA temp_store = MEMORY")
+    return db
+
+
+class ConnectionPool:
+    def __init__(self, size: int):
+        self._size = size
+        self._idle = Queue()
+        self._created = 0
+        self._lock = Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            create = self._created < self._size
+            if create:
+                self._created += 1
+        if create:
+            return connect()
+        # All connections are in use, so wait for one to be released.
+        return self._idle.get()
+
+    def release(self, db: sqlite3.Connection):
+        if db.in_transaction:
+            db.rollback()
+        self._idle.put(db)
+
+
+class Writer:
+    """
+    The single connection used for mutations in this process. SQLite only allows one writer at a time anyway, so
+    serialising writes here avoids lock contention and busy errors inside the database.
+    """
+
+    def __init__(self):
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        self._lock.acquire()
+        if self._db is None:
+            self._db = connect()
+        return self._db
+
+    def release(self, db: sqlite3.Connection):
+        assert db is self._db
+        if db.in_transaction:
+            db.rollback()
+        self._lock.release()
+
+
+_readers = ConnectionPool(DATABASE_READERS)
+_writer = Writer()
 
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
+        if request.method in READ_ONLY_METHODS:
+            g._database_owner = _readers
+        else:
+            g._database_owner = _writer
+        db = g._database = g._database_owner.acquire()
     return db
+
+
+@contextmanager
+def write_connection():
+    """
+    Provides the writer connection outside of requests (e.g. to background jobs), taking turns with requests that
+    write. Changes must be committed before the block ends, or they are rolled back.
+    """
+    db = _writer.acquire()
+    try:
+        yield db
+    finally:
+        _writer.release(db)
+
+
+def after_commit(callback: Callable[[], None]):
+    """
+    Runs `callback` once the current request's changes have been committed, e.g. to invalidate caches of them.
+    """
+    g.setdefault('_after_commit', []).append(callback)
+
+
+def run_after_commit_callbacks():
+    for callback in g.pop('_after_commit', ()):
+        callback()
+
+
+def _detach_db():
+    db = g.pop('_database', None)
+    owner = g.pop('_database_owner', None)
+    return db, owner
+
+
+def release_db():
+    db, owner = _detach_db()
+    if db is not None:
+        owner.release(db)
+
+
+class _StreamedBody:
+    """
+    A response body that owns the request's connection until the body is closed. The WSGI server closes it once the
+    body has been sent, but also when it's never iterated (e.g. for HEAD requests, or when the client goes away first),
+    which a generator's `finally` wouldn't catch.
+    """
+
+    def __init__(self, chunks: Iterable):
+        # The body is produced after the request has been torn down, so take ownership of the connection to stop it
+        # from being released while the rows are still being read from it.
+        self._db, self._owner = _detach_db()
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+        db, self._db = self._db, None
+        if db is not None:
+            self._owner.release(db)
+
+
+def stream_ndjson(rows: Iterable[Dict]):
+    return Response(_StreamedBody(_encode_json(row) + '\n' for row in rows), mimetype='application/x-ndjson')
+
+
+def _stream_json_object(key: str, rows: Iterable, head: Dict, tail: Dict):
+    def generate():
+        yield '{'
+        for k, v in head.items():
+            yield _encode_json(k) + ':' + _encode_json(v) + ','
+        yield _encode_json(key) + ':['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + _encode_json(row)
+        yield ']'
+        for k, v in tail.items():
+            yield ',' + _encode_json(k) + ':' + _encode_json(v() if callable(v) else v)
+        yield '}'
+
+    return Response(_StreamedBody(generate()), mimetype='application/json')
+
+
+def stream_json_array(key: str, rows: Iterable[Dict], **extra):
+    """
+    Streams `{key: [...rows], **extra}` as a JSON object, one row at a time.
+    Values in `extra` can be callables, which are called after all rows have been written.
+    """
+    return _stream_json_object(key, rows, {}, extra)
+
+
+def stream_json_rows(key: str, fields: Sequence[str], rows: Iterable[Tuple], **extra):
+    """
+    Like stream_json_array, but writes each row as an array of values in the order of `fields`, which are written once
+    before the rows. This avoids building a dict for, and repeating the keys of, every row.
+    """
+    return _stream_json_object(key, rows, {"fields": fields}, extra)
+
+
+def stream_download(chunks: Iterable, mimetype: str, filename: str):
+    """
+    Streams `chunks` (str or bytes) as a file attachment.
+    """
+    res = Response(_StreamedBody(chunks), mimetype=mimetype)
+    res.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return res
@@ -0,0 +1,156 @@
+from calendar import timegm
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import blake2b
+from os import getenv
+from threading import Lock
+from time import time
+from typing import Tuple, Optional, Iterable
+
+from flask import request, make_response, Response
+
+from server.api._common import get_db
+from server.cache import table_versions
+
+# Total size in bytes of response bodies kept in memory for repeated requests of unchanged data. 0 disables caching.
+RESPONSE_CACHE_SIZE = int(getenv('EUCALYPTUS_RESPONSE_CACHE_SIZE', '0'))
+# Larger responses are not cached, so that one of them can't evict everything else.
+RESPONSE_CACHE_MAX_ENTRY_SIZE = RESPONSE_CACHE_SIZE // 8
+
+
+class ResponseCache:
+    """
+    Least recently used response bodies, evicted once their total size exceeds `size` bytes.
+    """
+
+    def __init__(self, size: int, max_entry_size: int):
+        self.size = size
+        self.max_entry_size = max_entry_size
+        self._lock = Lock()
+        self._used = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, mimetype: str, body: bytes):
+        if len(body) > self.max_entry_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._used -= len(old[1])
+            self._entries[key] = (mimetype, body)
+            self._used += len(body)
+            while self._used > self.size:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._used -= len(evicted)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_ENTRY_SIZE) if RESPONSE_CACHE_SIZE else None
+
+
+class _CollectedBody:
+    """
+    Passes a streamed body through while keeping a copy of it, which is handed to `on_complete` once the whole body
+    has been sent.
+    """
+
+    def __init__(self, chunks: Iterable, on_complete, max_size: int):
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._max_size = max_size
+
+    def __iter__(self):
+        body = bytearray()
+        for chunk in self._chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if body is not None:
+                body += chunk
+                if len(body) > self._max_size:
+                    body = None
+            yield chunk
+        if body is not None:
+            self._on_complete(bytes(body))
+
+    def close(self):
+        # Closing the original body releases its resources (e.g. the database connection), even if it was never
+        # iterated, e.g. for HEAD requests or when the client goes away.
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _not_modified(etag: str, last_modified: Optional[int]) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    # HTTP dates have a resolution of seconds, like the versions' times of modification.
+    return since is not None and last_modified is not None and timegm(since.utctimetuple()) >= last_modified
+
+
+def versioned(*tables: str):
+    """
+    Makes a GET endpoint conditional on the data versions of the `tables` its response is derived from. Responses carry
+    an ETag and Last-Modified from the versions, and requests for data the client already has are answered with 304
+    Not Modified before the endpoint is called. Responses are also cached in memory if a response cache is configured.
+    """
+
+    def decorator(endpoint):
+        @wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            versions = table_versions(get_db().cursor(), tables)
+            etag = blake2b(repr(sorted(versions.items())).encode(), digest_size=12).hexdigest()
+            last_modified = max(modified for _, modified in versions.values())
+            if last_modified >= int(time()):
+                # Another change later in the same second would have the same time of modification, so the time can't
+                # tell whether a copy is current until the second is over. The ETag still can.
+                last_modified = None
+
+            def conditional(res: Response) -> Response:
+                res.set_etag(etag)
+                if last_modified is not None:
+                    res.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+                # Clients may reuse the response, but only after checking that it's still current.
+                res.headers['Cache-Control'] = 'no-cache'
+                return res
+
+            if _not_modified(etag, last_modified):
+                return conditional(Response(status=304))
+
+            key = None
+            if response_cache is not None:
+                # Same endpoint, arguments and versions of the data means the same response.
+                key = (
+                    request.endpoint,
+                    tuple(sorted(kwargs.items())),
+                    tuple(sorted(request.args.items(multi=True))),
+                    etag,
+                )
+                cached = response_cache.get(key)
+                if cached is not None:
+                    mimetype, body = cached
+                    return conditional(Response(body, mimetype=mimetype))
+
+            res = make_response(endpoint(*args, **kwargs))
+            if key is not None and res.status_code == 200:
+                mimetype = res.mimetype
+                if res.is_streamed:
+                    res.response = _CollectedBody(
+                        res.response,
+                        lambda body: response_cache.put(key, mimetype, body),
+                        response_cache.max_entry_size,
+                    )
+                else:
+                    response_cache.put(key, mimetype, res.get_data())
+            return conditional(res)
+
+        return wrapper
+
+    return decorator
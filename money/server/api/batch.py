@@ -0,0 +1,129 @@
+import json
+from sqlite3 import Cursor
+from typing import Dict, List, Set
+
+from flask import Blueprint
+
+from server.api._common import get_db
+from server.api.transaction import transaction_patch_values, delete_transactions
+from server.api.transaction_part import new_part_values, part_patch_values
+from server.sql import begin_write, patch_rows
+from server.validation import require_json_object_body, v_dict_entry, listv, enumv, intv, \
+    MalformedInputException
+
+batch_api = Blueprint('batch_api', __name__)
+
+# Operations are applied grouped by kind, in this order, but with the same outcome as applying them in the order they
+# were given.
+BATCH_OPERATIONS = [
+    'update_transaction',
+    'create_transaction_part',
+    'update_transaction_part',
+    'delete_transaction',
+]
+
+
+class BatchOperation:
+    __slots__ = ('kind', 'target', 'values')
+
+    def __init__(self, kind: str, target: int, values):
+        self.kind = kind
+        # ID of the transaction or part that the operation applies to.
+        self.target = target
+        self.values = values
+
+
+def _parse_operation(op: Dict) -> BatchOperation:
+    kind = v_dict_entry(op, 'op', vv=enumv(options=BATCH_OPERATIONS))
+    if kind == 'update_transaction':
+        return BatchOperation(kind, v_dict_entry(op, 'transaction', vv=intv(min_val=0)), transaction_patch_values(op))
+    if kind == 'create_transaction_part':
+        return BatchOperation(kind, v_dict_entry(op, 'transaction', vv=intv(min_val=0)), new_part_values(op))
+    if kind == 'update_transaction_part':
+        return BatchOperation(kind, v_dict_entry(op, 'part', vv=intv(min_val=0)), part_patch_values(op))
+    return BatchOperation(kind, v_dict_entry(op, 'transaction', vv=intv(min_val=0)), None)
+
+
+def _existing_ids(c: Cursor, table: str, ids: Set[int]) -> Set[int]:
+    c.execute(f"SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(list(ids)),))
+    return {row[0] for row in c.fetchall()}
+
+
+def _part_transactions(c: Cursor, ids: Set[int]) -> Dict[int, int]:
+    c.execute("SELECT id, txn FROM txn_part WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(list(ids)),))
+    return dict(c.fetchall())
+
+
+def _next_ids(c: Cursor, table: str, count: int) -> List[int]:
+    # AUTOINCREMENT assigns IDs in sequence after the last one recorded in sqlite_sequence, and the write lock held by
+    # this transaction means nothing else can insert in the meantime.
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    row = c.fetchone()
+    last = 0 if row is None else row[0]
+    return list(range(last + 1, last + 1 + count))
+
+
+@batch_api.route("/batch", methods=['POST'])
+def apply_batch():
+    opt = require_json_object_body()
+    raw_operations = v_dict_entry(opt, 'operations', vv=listv())
+    operations = []
+    for i, op in enumerate(raw_operations):
+        if type(op) != dict:
+            raise MalformedInputException(f"Operation number {i} is not an object.")
+        try:
+            operations.append(_parse_operation(op))
+        except MalformedInputException as e:
+            raise MalformedInputException(f"Operation number {i}: {e.description}")
+
+    c = get_db().cursor()
+    begin_write(c)
+
+    # Operations on rows that don't exist, including those deleted by earlier operations, are skipped and reported as not
+    # found; the rest are all applied. Deletions are applied last, so anything before them still happens first.
+    txns = _existing_ids(c, 'txn', {op.target for op in operations if op.kind != 'update_transaction_part'})
+    part_txns = _part_transactions(c, {op.target for op in operations if op.kind == 'update_transaction_part'})
+    deleted: Set[int] = set()
+    results: List[Dict] = []
+    by_kind: Dict[str, List[int]] = {kind: [] for kind in BATCH_OPERATIONS}
+    for i, op in enumerate(operations):
+        if op.kind == 'update_transaction_part':
+            txn = part_txns.get(op.target)
+        else:
+            txn = op.target if op.target in txns else None
+        if txn is None or txn in deleted:
+            results.append({"status": 404})
+            continue
+        results.append({"status": 200})
+        by_kind[op.kind].append(i)
+        if op.kind == 'delete_transaction':
+            deleted.add(txn)
+
+    patch_rows(
+        c=c,
+        table='txn',
+        rows=((operations[i].target, operations[i].values) for i in by_kind['update_transaction']),
+    )
+
+    created = by_kind['create_transaction_part']
+    if created:
+        ids = _next_ids(c, 'txn_part', len(created))
+        c.executemany(
+            "INSERT INTO txn_part (txn, comment, amount, category) VALUES (?, ?, ?, ?)",
+            ((operations[i].target, *operations[i].values) for i in created),
+        )
+        for i, part_id in zip(created, ids):
+            results[i]["id"] = part_id
+
+    patch_rows(
+        c=c,
+        table='txn_part',
+        rows=((operations[i].target, operations[i].values) for i in by_kind['update_transaction_part']),
+    )
+
+    if deleted:
+        delete_transactions(c, list(deleted))
+
+    return {
+        "results": results,
+    }
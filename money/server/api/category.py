@@ -1,9 +1,12 @@
 from flask import request, Blueprint
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, NotFound
 
 from server.api._common import get_db
-from server.sql import require_one, fetch_all_as_dict, Column, Cond, Table
-from server.validation import require_json_object_body, v_dict_entry, strv, intv
+from server.api._http_cache import versioned
+from server import category_tree
+from server.cache import category_cache
+from server.sql import fetch_all_as_dict, Column, Cond, Table, begin_write
+from server.validation import require_json_object_body, v_dict_entry, strv, intv, v_list
 
 category_api = Blueprint('category_api', __name__)
 
@@ -15,45 +18,25 @@ def create_category():
     target = v_dict_entry(opt, 'target', vv=intv(min_val=0), optional=True)
     mode = v_dict_entry(opt, 'mode', vv=strv())
 
-    # TODO Lock table
     c = get_db().cursor()
+    begin_write(c)
 
     if target is None:
         if mode != 'root':
             raise BadRequest('Target is missing')
         if c.execute("SELECT COUNT(*) FROM category").fetchone()[0] != 0:
             raise BadRequest('Root already exists')
-        target_start = -1
-        mode = 'first'
+        category_id = category_tree.insert_root(c, name)
     else:
-        c.execute("SELECT set_start, set_end FROM category WHERE id = ?", (target,))
-        target_start, target_end = require_one(c.fetchall())
-
-    if mode == 'after':
-        shift_greater_than = target_end
-    elif mode == 'before':
-        shift_greater_than = target_start - 1
-    elif mode == 'first':
-        shift_greater_than = target_start
-    else:
-        raise BadRequest('Invalid mode')
-
-    c.execute("UPDATE category SET set_start = set_start + 2 WHERE set_start > ?", (shift_greater_than,))
-    c.execute("UPDATE category SET set_end = set_end + 2 WHERE set_end > ?", (shift_greater_than,))
-    # TODO Handle unique
-    c.execute(
-        "INSERT INTO category (name, comment, set_start, set_end) VALUES (?, '', ?, ?)",
-        (name, shift_greater_than + 1, shift_greater_than + 2)
-    )
-
-    category_id = c.lastrowid
-    # TODO Unlock table
+        category_id = category_tree.insert(c, name, target, mode)
+
     return {
         "id": category_id,
     }
 
 
 @category_api.route("/categories", methods=['GET'])
+@versioned('category')
 def get_or_suggest_categories():
     opt = request.args
     query = v_dict_entry(opt, 'query', vv=strv(min_len=1), optional=True)
@@ -69,33 +52,67 @@ def get_or_suggest_categories():
                     Column('id'),
                     Column('name', 'label'),
                 ),
-                where=Cond('name LIKE ?', f'{query}%'),
+                where=Cond.starts_with('name', query),
+                order_by='name COLLATE NOCASE',
             ),
         }
 
+    tree = category_cache.get()
     return {
-        "categories": fetch_all_as_dict(
-            c=get_db().cursor(),
-            tables=(
-                Table('category', 'node'),
-                Table('category', 'parent'),
-            ),
-            cols=(
-                Column('node.id', 'id'),
-                Column('node.name', 'name'),
-                Column('node.comment', 'comment'),
-                Column('COUNT(parent.id) - 1', 'depth'),
-            ),
-            where=Cond('node.set_start BETWEEN parent.set_start AND parent.set_end'),
-            group_by='node.id',
-            order_by='node.set_start',
-        )
+        "categories": [
+            {
+                "id": cat.id,
+                "name": cat.name,
+                "comment": cat.comment,
+                "depth": cat.depth,
+            }
+            for cat in tree.categories
+        ],
+    }
+
+
+@category_api.route("/category/<category>", methods=['PATCH'])
+def move_category(**args):
+    category = v_dict_entry(args, 'category', vv=intv(min_val=0, parse_from_str=True))
+    opt = require_json_object_body()
+    target = v_dict_entry(opt, 'target', vv=intv(min_val=0))
+    mode = v_dict_entry(opt, 'mode', vv=strv())
+
+    c = get_db().cursor()
+    begin_write(c)
+    category_tree.move(c, category, target, mode)
+    return {}
+
+
+@category_api.route("/category/<category>", methods=['DELETE'])
+def delete_category(**args):
+    category = v_dict_entry(args, 'category', vv=intv(min_val=0, parse_from_str=True))
+
+    c = get_db().cursor()
+    begin_write(c)
+    # Deletes the whole subtree; parts in any of the deleted categories become uncategorised.
+    category_tree.delete(c, category)
+    return {}
+
+
+@category_api.route("/categories/names", methods=['GET'])
+@versioned('category')
+def get_category_names():
+    categories = v_list(request.args.getlist('id'), 'ids', vv=intv(min_val=0, parse_from_str=True))
+    tree = category_cache.get()
+    # Unknown IDs are left out.
+    return {
+        "names": {cid: tree.by_id[cid].name for cid in categories if cid in tree.by_id},
     }
 
 
 @category_api.route("/category/<category>/name", methods=['GET'])
+@versioned('category')
 def get_category_name(**args):
     category = v_dict_entry(args, 'category', vv=intv(min_val=0, parse_from_str=True))
+    tree = category_cache.get()
+    if category not in tree.by_id:
+        raise NotFound()
     return {
-        "name": require_one(get_db().cursor().execute("SELECT name FROM category WHERE id = ?", (category,)).fetchall())[0],
+        "name": tree.by_id[category].name,
     }
@@ -1,14 +1,14 @@
-import csv
-import json
-from datetime import datetime
-from io import StringIO
+from os import remove
 
 from flask import request, Blueprint
 
-from server.api._common import get_db
+from server.api._common import get_db, after_commit
+from server.api._http_cache import versioned
+from server.import_jobs import spool_upload, create_import_job, import_worker
+from server.importer import ImportOptions
 from server.model import fetch_datasets
 from server.sql import Cond
-from server.validation import parse_money_amount, intv, v_dict_entry, strv
+from server.validation import intv, v_dict_entry, strv
 
 dataset_api = Blueprint('dataset_api', __name__)
 
@@ -21,52 +21,36 @@ def create_dataset(**args):
     timestamp_format = v_dict_entry(opt, 'timestamp_format', vv=strv())
     description_column = v_dict_entry(opt, 'description_column', vv=intv(parse_from_str=True))
     amount_column = v_dict_entry(opt, 'amount_column', vv=intv(parse_from_str=True))
+    # For exports with separate debit (amount_column) and credit columns.
+    credit_column = v_dict_entry(opt, 'credit_column', vv=intv(parse_from_str=True), optional=True)
 
-    c = get_db().cursor()
-    # TODO Handle errors
-    c.execute("INSERT INTO dataset (source, comment, created) VALUES (?, '', DATETIME('now'))", (source,))
-    dataset_id = c.lastrowid
-    for row in csv.reader(StringIO(request.get_data(as_text=True))):
-        raw = json.dumps(row)
-        malformed = False
-
-        try:
-            # TODO Convert to UTC
-            timestamp = datetime.strptime(row[timestamp_column], timestamp_format)
-        except (IndexError, ValueError):
-            # TODO Convert to UTC
-            timestamp = datetime.now()
-            malformed = True
-
-        try:
-            description = row[description_column]
-        except IndexError:
-            description = ''
-            malformed = True
-
-        try:
-            amount = -parse_money_amount(row[amount_column])
-        except (IndexError, ValueError):
-            amount = 0
-            malformed = True
-
-        c.execute(
-            "INSERT INTO txn (dataset, raw, comment, malformed, timestamp, description, amount) VALUES (?, ?, '', ?, ?, ?, ?)",
-            (dataset_id, raw, malformed, timestamp, description, amount)
-        )
-        transaction_id = c.lastrowid
-        if not malformed:
-            c.execute(
-                "INSERT INTO txn_part (txn, comment, amount, category) VALUES (?, '', ?, NULL)",
-                (transaction_id, amount)
-            )
+    # Save the upload before taking the write lock; the rows are then imported by a background job.
+    path, size = spool_upload(request.stream)
+    try:
+        c = get_db().cursor()
+        # TODO Handle errors
+        c.execute("INSERT INTO dataset (source, comment, created) VALUES (?, '', DATETIME('now'))", (source,))
+        dataset_id = c.lastrowid
+        job_id = create_import_job(c, dataset_id, path, size, ImportOptions(
+            timestamp_column=timestamp_column,
+            timestamp_format=timestamp_format,
+            description_column=description_column,
+            amount_column=amount_column,
+            credit_column=credit_column,
+        ))
+    except BaseException:
+        remove(path)
+        raise
+    after_commit(lambda: import_worker.submit(job_id))
 
     return {
         "id": dataset_id,
-    }
+        "job": job_id,
+    }, 202
 
 
 @dataset_api.route("/datasets", methods=['GET'])
+@versioned('dataset', 'dataset_source')
 def get_datasets():
     return {
         "datasets": fetch_datasets(get_db().cursor(), Cond('TRUE'))
@@ -74,6 +58,7 @@ def get_datasets():
 
 
 @dataset_api.route("/dataset/<dataset>", methods=['GET'])
+@versioned('dataset', 'dataset_source')
 def get_dataset(**opt):
     dataset = v_dict_entry(opt, 'dataset', vv=intv(min_val=0, parse_from_str=True))
     return {
@@ -1,6 +1,7 @@
 from flask import Blueprint
 
 from server.api._common import get_db
+from server.api._http_cache import versioned
 from server.sql import fetch_all_as_dict, Column, Cond, Table
 from server.validation import require_json_object_body, v_dict_entry, strv
 
@@ -21,6 +22,7 @@ def create_dataset_source():
 
 
 @dataset_source_api.route("/dataset_sources", methods=['GET'])
+@versioned('dataset_source')
 def get_dataset_sources():
     return {
         "sources": fetch_all_as_dict(
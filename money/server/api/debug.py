@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+from werkzeug.exceptions import NotFound
+
+from server.instrumentation import METRICS_ENABLED, render_metrics
+
+debug_api = Blueprint('debug_api', __name__)
+
+
+@debug_api.route("/_debug/metrics", methods=['GET'])
+def get_metrics():
+    if not METRICS_ENABLED:
+        raise NotFound()
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,54 @@
+from flask import Blueprint
+from werkzeug.exceptions import BadRequest, NotFound
+
+from server.api._common import get_db
+from server.api._http_cache import versioned
+from server.validation import v_dict_entry, intv
+
+import_job_api = Blueprint('import_job_api', __name__)
+
+
+@import_job_api.route("/import_job/<job>", methods=['GET'])
+@versioned('import_job')
+def get_import_job(**args):
+    job = v_dict_entry(args, 'job', vv=intv(min_val=0, parse_from_str=True))
+    row = get_db().cursor().execute(
+        """
+            SELECT dataset, status, error, size, offset, rows, malformed, skipped, matched, started, updated
+            FROM import_job
+            WHERE id = ?
+        """,
+        (job,)
+    ).fetchone()
+    if row is None:
+        raise NotFound()
+    dataset, status, error, size, offset, rows, malformed, skipped, matched, started, updated = row
+    elapsed = None if started is None else updated - started
+    return {
+        "id": job,
+        "dataset": dataset,
+        "status": status,
+        "error": error,
+        "bytes_total": size,
+        "bytes_done": offset,
+        "rows": rows,
+        "malformed": malformed,
+        "inserted": rows - skipped,
+        "skipped": skipped,
+        "matched": matched,
+        # As of the last committed chunk.
+        "rows_per_second": rows / elapsed if elapsed else None,
+    }
+
+
+@import_job_api.route("/import_job/<job>/cancel", methods=['POST'])
+def cancel_import_job(**args):
+    job = v_dict_entry(args, 'job', vv=intv(min_val=0, parse_from_str=True))
+    c = get_db().cursor()
+    # The job stops before its next chunk, keeping the rows imported so far.
+    c.execute("UPDATE import_job SET status = 'cancelling' WHERE id = ? AND status IN ('queued', 'running')", (job,))
+    if c.rowcount == 0:
+        if c.execute("SELECT COUNT(*) FROM import_job WHERE id = ?", (job,)).fetchone()[0] == 0:
+            raise NotFound()
+        raise BadRequest('Import job has already ended')
+    return {}
@@ -0,0 +1,77 @@
+from flask import Blueprint
+
+from server.api._common import get_db
+from server.api._http_cache import versioned
+from server.rules import rule_cache, apply_rules
+from server.sql import require_changed_row, Cond, begin_write
+from server.validation import require_json_object_body, v_dict_entry, strv, intv, v_list, listv, patternv, \
+    MalformedInputException
+
+rule_api = Blueprint('rule_api', __name__)
+
+
+@rule_api.route("/rules", methods=['POST'])
+def create_rule():
+    opt = require_json_object_body()
+    comment = v_dict_entry(opt, 'comment', optional='', vv=strv())
+    description_substring = v_dict_entry(opt, 'description_substring', optional=True, vv=strv(min_len=1))
+    description_pattern = v_dict_entry(opt, 'description_pattern', optional=True, vv=patternv())
+    amount_min = v_dict_entry(opt, 'amount_min', optional=True, vv=intv())
+    amount_max = v_dict_entry(opt, 'amount_max', optional=True, vv=intv())
+    source = v_dict_entry(opt, 'source', optional=True, vv=intv(min_val=0))
+    category = v_dict_entry(opt, 'category', optional=True, vv=intv(min_val=0))
+    tags = v_list(v_dict_entry(opt, 'tags', optional=[], vv=listv()), 'tags', vv=intv(min_val=0))
+
+    conditions = (description_substring, description_pattern, amount_min, amount_max, source)
+    if all(cond is None for cond in conditions):
+        raise MalformedInputException("A rule needs at least one condition.")
+    if amount_min is not None and amount_max is not None and amount_min > amount_max:
+        raise MalformedInputException("The amount_min is larger than the amount_max.")
+
+    c = get_db().cursor()
+    c.execute(
+        """
+            INSERT INTO rule (comment, description_substring, description_pattern, amount_min, amount_max, source, category)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (comment, description_substring, description_pattern, amount_min, amount_max, source, category)
+    )
+    rule_id = c.lastrowid
+    c.executemany("INSERT OR IGNORE INTO rule_tag (rule, tag) VALUES (?, ?)", ((rule_id, tag) for tag in tags))
+    return {
+        "id": rule_id,
+    }
+
+
+@rule_api.route("/rules", methods=['GET'])
+@versioned('rule', 'rule_tag')
+def get_rules():
+    rule_set = rule_cache.get()
+    return {
+        "rules": [rule.as_dict() for rule in rule_set.rules],
+    }
+
+
+@rule_api.route("/rule/<rule>", methods=['DELETE'])
+def delete_rule(**args):
+    rule = v_dict_entry(args, 'rule', vv=intv(min_val=0, parse_from_str=True))
+
+    c = get_db().cursor()
+    c.execute("DELETE FROM rule_tag WHERE rule = ?", (rule,))
+    c.execute("DELETE FROM rule WHERE id = ?", (rule,))
+    require_changed_row(c.rowcount)
+    return {}
+
+
+@rule_api.route("/rules/apply", methods=['POST'])
+def apply_rules_to_transactions():
+    opt = require_json_object_body()
+    dataset = v_dict_entry(opt, 'dataset', optional=True, vv=intv(min_val=0))
+
+    c = get_db().cursor()
+    begin_write(c)
+    rule_set = rule_cache.get()
+    matched = apply_rules(c, rule_set, Cond('TRUE') if dataset is None else Cond('txn.dataset = ?', dataset))
+    return {
+        "matched": matched,
+    }
@@ -1,12 +1,14 @@
 from flask import Blueprint
 
 from server.api._common import get_db
+from server.api._http_cache import versioned
 from server.validation import require_json_object_body, strv, v_dict_entry
 
 setting_api = Blueprint('setting_api', __name__)
 
 
 @setting_api.route("/setting/name", methods=['GET'])
+@versioned('setting')
 def get_name():
     return {
         "name": get_db().cursor().execute("SELECT value FROM setting WHERE name = 'name'").fetchone()[0]
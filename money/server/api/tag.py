@@ -1,14 +1,16 @@
 from flask import Blueprint, request
+from werkzeug.exceptions import NotFound
 
 from server.api._common import get_db
-from server.api.category import category_api
-from server.sql import fetch_all_as_dict, Table, Column, Cond, require_one
-from server.validation import require_json_object_body, v_dict_entry, strv, intv
+from server.api._http_cache import versioned
+from server.cache import tag_cache
+from server.sql import fetch_all_as_dict, Table, Column, Cond
+from server.validation import require_json_object_body, v_dict_entry, strv, intv, v_list
 
 tag_api = Blueprint('tag_api', __name__)
 
 
-@category_api.route("/tags", methods=['POST'])
+@tag_api.route("/tags", methods=['POST'])
 def create_tag():
     opt = require_json_object_body()
     name = v_dict_entry(opt, 'name', vv=strv())
@@ -24,7 +26,8 @@ def create_tag():
     }
 
 
-@category_api.route("/tags", methods=['GET'])
+@tag_api.route("/tags", methods=['GET'])
+@versioned('tag')
 def get_or_suggest_tags():
     opt = request.args
     query = v_dict_entry(opt, 'query', vv=strv(min_len=1), optional=True)
@@ -40,29 +43,42 @@ def get_or_suggest_tags():
                     Column('id'),
                     Column('name', 'label'),
                 ),
-                where=Cond('name LIKE ?', f'{query}%'),
+                where=Cond.starts_with('name', query),
+                order_by='name COLLATE NOCASE',
             ),
         }
 
+    tag_list = tag_cache.get()
     return {
-        "tags": fetch_all_as_dict(
-            c=get_db().cursor(),
-            tables=(
-                Table('tag'),
-            ),
-            cols=(
-                Column('id'),
-                Column('name'),
-                Column('comment'),
-            ),
-            where=Cond('TRUE'),
-        )
+        "tags": [
+            {
+                "id": tag.id,
+                "name": tag.name,
+                "comment": tag.comment,
+            }
+            for tag in tag_list.tags
+        ],
+    }
+
+
+@tag_api.route("/tags/names", methods=['GET'])
+@versioned('tag')
+def get_tag_names():
+    tags = v_list(request.args.getlist('id'), 'ids', vv=intv(min_val=0, parse_from_str=True))
+    tag_list = tag_cache.get()
+    # Unknown IDs are left out.
+    return {
+        "names": {tid: tag_list.by_id[tid].name for tid in tags if tid in tag_list.by_id},
     }
 
 
-@category_api.route("/tag/<tag>/name", methods=['GET'])
+@tag_api.route("/tag/<tag>/name", methods=['GET'])
+@versioned('tag')
 def get_tag_name(**args):
     tag = v_dict_entry(args, 'tag', vv=intv(min_val=0, parse_from_str=True))
+    tag_list = tag_cache.get()
+    if tag not in tag_list.by_id:
+        raise NotFound()
     return {
-        "name": require_one(get_db().cursor().execute("SELECT name FROM tag WHERE id = ?", (tag,)).fetchall())[0],
+        "name": tag_list.by_id[tag].name,
     }
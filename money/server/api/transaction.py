@@ -1,49 +1,514 @@
+import json
+from datetime import datetime, time, date
+from operator import itemgetter
+from sqlite3 import Cursor
+from typing import Optional, Iterable, List, Callable, Dict, Set, Tuple
+
 from flask import request, Blueprint
+from werkzeug.exceptions import BadRequest
 
-from server.api._common import get_db
-from server.model import fetch_transactions
-from server.sql import require_changed_row, patch_row, Cond, Table, Column, JoinMethod, Join, fetch_all_as_dict
+from server import category_tree, analytics, export
+from server.api._common import get_db, stream_ndjson, stream_json_array, stream_json_rows, stream_download
+from server.api._http_cache import versioned
+from server.cache import category_cache
+from server.downsample import lttb
+from server.model import select_transaction_rows
+from server.sql import require_changed_row, patch_row, Cond, Table, Column, JoinMethod, Join, fetch_all_as_dict, \
+    fts_prefix_query, execute_select
 from server.validation import require_json_object_body, v_dict_entry, timestampv, intv, v_list, strv, enumv
 
 transaction_api = Blueprint('transaction_api', __name__)
 
+# Divisor that turns a YYYYMMDD day into the integer bucket (YYYY, YYYYMM or YYYYMMDD) of each time unit.
+DAY_DIVISORS = {
+    'year': 10000,
+    'month': 100,
+    'day': 1,
+}
+
+
+def _parse_page_key(val) -> Tuple[int, int]:
+    # The (timestamp, id) of the last transaction of the previous page, as returned by PageCursor.next.
+    try:
+        timestamp, id = val.split('_')
+        return int(timestamp), int(id)
+    except (AttributeError, ValueError):
+        raise ValueError('is not a page cursor')
+
+
+class PageCursor:
+    def __init__(
+            self,
+            limit: Optional[int],
+            key_of: Callable = itemgetter('_ts:timestamp', 'id'),
+            offset: Optional[int] = None,
+    ):
+        self.limit = limit
+        self.key_of = key_of
+        # Pages of ranked search results are addressed by offset instead of by the last transaction.
+        self.offset = offset
+        self.count = 0
+        self.last_key = None
+
+    def track(self, transactions: Iterable):
+        for t in transactions:
+            self.count += 1
+            self.last_key = self.key_of(t)
+            yield t
+
+    def next(self):
+        # A short page means there is nothing after it.
+        if self.limit is None or self.count < self.limit:
+            return None
+        if self.offset is not None:
+            return self.offset + self.count
+        # The cursor carries the values compared with rather than just the ID, so that it still works if the
+        # transaction is deleted before the next page is requested.
+        timestamp, id = self.last_key
+        return f'{timestamp}_{id}'
+
 
 @transaction_api.route("/transactions", methods=['GET'])
+@versioned('txn', 'txn_part', 'txn_part_tag', 'category')
 def get_transactions():
     opt = request.args
+    cond = _transaction_filters(opt)
+    limit = v_dict_entry(opt, 'limit', vv=intv(min_val=1, parse_from_str=True), optional=True)
+    after = v_dict_entry(opt, 'after', vv=_parse_page_key, optional=True)
+    # Full-text search over descriptions and comments; results are ordered by relevance and paged by offset.
+    q = v_dict_entry(opt, 'q', vv=strv(min_len=1), optional=True)
+    offset = v_dict_entry(opt, 'offset', vv=intv(min_val=0, parse_from_str=True), optional=True)
+    stream = v_dict_entry(opt, 'stream', vv=enumv(options=['json', 'ndjson', 'rows']), optional=True)
+
+    search = None
+    if q is not None:
+        search = fts_prefix_query(q)
+        if search is None:
+            raise BadRequest('Search query has no words')
+        if after is not None:
+            raise BadRequest('Search results are paged by offset')
+        if offset is None:
+            offset = 0
+    elif offset is not None:
+        raise BadRequest('Transactions are paged by ID unless searching')
+
+    if after is not None:
+        # Keyset pagination: continue strictly after the (timestamp, id) of the last transaction of the previous page.
+        cond += Cond("(txn.timestamp, txn.id) > (?, ?)", *after)
+
+    if search is not None:
+        cond += Cond("txn_search MATCH ?", search)
+        group_by = "txn.id"
+        # FTS5's rank is bm25, where more relevant matches have lower values.
+        order_by = "txn_search.rank, txn.id"
+    else:
+        # Grouping by the ID alone would be the same, but this lets the timestamp index provide the order.
+        group_by = order_by = "txn.timestamp, txn.id"
+
+    fields, rows = select_transaction_rows(
+        get_db().cursor(),
+        cond,
+        group_by=group_by,
+        order_by=order_by,
+        limit=limit,
+        offset=offset,
+        search=search is not None,
+    )
+
+    if stream == 'rows':
+        page = PageCursor(limit, key_of=itemgetter(fields.index('_ts:timestamp'), fields.index('id')), offset=offset)
+        return stream_json_rows("transactions", fields, page.track(rows), next=page.next)
+
+    transactions = (dict(zip(fields, row)) for row in rows)
+    if stream == 'ndjson':
+        return stream_ndjson(transactions)
+
+    page = PageCursor(limit, offset=offset)
+    if stream == 'json':
+        return stream_json_array("transactions", page.track(transactions), next=page.next)
+    return {
+        "transactions": list(page.track(transactions)),
+        "next": page.next(),
+    }
+
+
+@transaction_api.route("/transactions/export", methods=['GET'])
+def export_transactions():
+    opt = request.args
+    cond = _transaction_filters(opt)
+    fmt = v_dict_entry(opt, 'format', vv=enumv(options=list(export.EXPORT_FORMATS)))
+    if fmt == 'parquet' and not export.PARQUET_SUPPORTED:
+        raise BadRequest('Parquet export requires pyarrow')
+
+    fields, rows = select_transaction_rows(
+        get_db().cursor(),
+        cond,
+        # Like the listing, in the order of the txn_timestamp index, so rows are streamed without sorting them first.
+        group_by="txn.timestamp, txn.id",
+        order_by="txn.timestamp, txn.id",
+    )
+    mimetype, write = export.EXPORT_FORMATS[fmt]
+    return stream_download(write(fields, rows), mimetype, f'transactions.{fmt}')
+
+
+def _transaction_filter_values(opt):
+    """
+    Validates the filters shared by the transaction listing, export and trend, returning (from, to, dataset,
+    categories, category subtrees, tags).
+    """
     dt_from = v_dict_entry(opt, 'from', optional=True, vv=timestampv(parse_from_str=True))
     dt_to = v_dict_entry(opt, 'to', optional=True, vv=timestampv(parse_from_str=True))
     dataset = v_dict_entry(opt, 'dataset', vv=intv(min_val=0, parse_from_str=True), optional=True)
     categories = v_list(opt.getlist('category'), 'categories', vv=intv(min_val=0, parse_from_str=True))
+    category_subtrees = v_list(opt.getlist('category_subtree'), 'category subtrees', vv=intv(min_val=0, parse_from_str=True))
     tags = v_list(opt.getlist('tag'), 'tags', vv=intv(min_val=0, parse_from_str=True))
+    return dt_from, dt_to, dataset, categories, category_subtrees, tags
+
+
+def _transaction_filters(opt) -> Cond:
+    """
+    Validates the filters shared by the transaction listing and export, returning a condition for their query.
+    """
+    return _transaction_filters_cond(*_transaction_filter_values(opt))
 
+
+def _transaction_filters_cond(
+        dt_from: Optional[datetime],
+        dt_to: Optional[datetime],
+        dataset: Optional[int],
+        categories: List[int],
+        category_subtrees: List[int],
+        tags: List[int],
+) -> Cond:
     cond = Cond('TRUE')
     if dt_from is not None:
-        cond += Cond("txn.timestamp >= ?", dt_from)
+        cond += Cond("txn.timestamp >= ?", _epoch(dt_from))
     if dt_to is not None:
-        cond += Cond("txn.timestamp <= ?", dt_to)
+        cond += Cond("txn.timestamp <= ?", _epoch(dt_to))
     if dataset is not None:
         cond += Cond("txn.dataset = ?", dataset)
-    if categories:
-        cond += Cond(f"txn_part.category IN ({','.join(map(str, categories))})")
+    if categories or category_subtrees:
+        cond += _category_cond("txn_part.category", categories, category_subtrees)
     if tags:
-        cond += Cond(f"txn_part.id IN (SELECT txn_part FROM txn_part_tag WHERE tag IN ({','.join(map(str, tags))}))")
-
-    return {
-        "transactions": fetch_transactions(get_db().cursor(), cond, group_by="txn_part.txn"),
-    }
+        cond += Cond("txn_part.id IN (SELECT txn_part FROM txn_part_tag WHERE tag IN (SELECT value FROM json_each(?)))", json.dumps(tags))
+    return cond
 
 
 @transaction_api.route("/transactions/analysis", methods=['GET'])
+@versioned('txn', 'txn_part', 'txn_part_tag', 'category')
 def get_transactions_analysis():
     opt = request.args
     dt_from = v_dict_entry(opt, 'from', optional=True, vv=timestampv(parse_from_str=True))
     dt_to = v_dict_entry(opt, 'to', optional=True, vv=timestampv(parse_from_str=True))
-    split_by = v_dict_entry(opt, 'split_by', vv=enumv(options=['category', 'none']))
+    # With category_tree, the amount of each category includes the amounts of all its descendants.
+    split_by = v_dict_entry(opt, 'split_by', vv=enumv(options=['category', 'category_tree', 'none']))
     time_unit = v_dict_entry(opt, 'time_unit', vv=enumv(options=['year', 'month', 'day', 'none']))
     categories = v_list(opt.getlist('category'), 'categories', vv=intv(min_val=0, parse_from_str=True))
+    category_subtrees = v_list(opt.getlist('category_subtree'), 'category subtrees', vv=intv(min_val=0, parse_from_str=True))
     tags = v_list(opt.getlist('tag'), 'tags', vv=intv(min_val=0, parse_from_str=True))
 
+    filters = (dt_from, dt_to, split_by, time_unit, categories, category_subtrees, tags)
+    if analytics.engine is not None:
+        analysis = _engine_analysis(*filters)
+    else:
+        if len(tags) <= 1 and _is_start_of_day(dt_from) and _is_end_of_day(dt_to):
+            query = _rollup_analysis_query(*filters)
+        else:
+            query = _analysis_query(*filters)
+        analysis = fetch_all_as_dict(c=get_db().cursor(), **query)
+
+    if split_by == 'category_tree':
+        analysis = _roll_up_analysis(analysis)
+    return {
+        "analysis": analysis,
+    }
+
+
+@transaction_api.route("/transactions/balance", methods=['GET'])
+@versioned('txn', 'txn_part', 'txn_part_tag', 'category')
+def get_transactions_balance():
+    opt = request.args
+    cond = _transaction_filters(opt)
+    time_unit = v_dict_entry(opt, 'time_unit', vv=enumv(options=['transaction', 'day', 'month']))
+    # Reduces the result to this many points that keep the shape of the balance over time.
+    points = v_dict_entry(opt, 'points', vv=intv(min_val=3, parse_from_str=True), optional=True)
+
+    # Each row is (x for downsampling, label, balance), where the balance starts from zero at the start of the range.
+    if time_unit == 'transaction':
+        cols = (
+            Column('txn.timestamp', 'x'),
+            Column('txn.id', 'id'),
+            Column('SUM(SUM(txn_part.amount)) OVER (ORDER BY txn.timestamp, txn.id)', 'balance'),
+        )
+        # Grouping by the ID alone would be the same, but this lets the timestamp index provide the order.
+        group_by = 'txn.timestamp, txn.id'
+        order_by = 'txn.timestamp, txn.id'
+    else:
+        bucket = 'txn.day' if time_unit == 'day' else 'txn.year_month'
+        cols = (
+            Column(bucket, 'x'),
+            Column(_time_unit_label(time_unit, bucket), 'time_unit'),
+            Column(f'SUM(SUM(txn_part.amount)) OVER (ORDER BY {bucket})', 'balance'),
+        )
+        group_by = bucket
+        order_by = bucket
+
+    c = get_db().cursor()
+    execute_select(
+        c=c,
+        tables=(
+            Table('txn'),
+        ),
+        cols=cols,
+        joins=(
+            Join(JoinMethod.inner, Table('txn_part'), 'txn_part.txn = txn.id'),
+        ),
+        where=cond,
+        group_by=group_by,
+        order_by=order_by,
+    )
+    rows = c.fetchall()
+
+    if points is not None and len(rows) > points:
+        if time_unit == 'day':
+            xs = [date(x // 10000, x // 100 % 100, x % 100).toordinal() for x, _, _ in rows]
+        elif time_unit == 'month':
+            xs = [x // 100 * 12 + x % 100 for x, _, _ in rows]
+        else:
+            xs = [x for x, _, _ in rows]
+        rows = [rows[i] for i in lttb(xs, [balance for _, _, balance in rows], points)]
+
+    if time_unit == 'transaction':
+        balance = [{"id": txn_id, "_ts:timestamp": ts, "balance": total} for ts, txn_id, total in rows]
+    else:
+        balance = [{"time_unit": label, "balance": total} for _, label, total in rows]
+    return {
+        "balance": balance,
+    }
+
+
+@transaction_api.route("/transactions/trend", methods=['GET'])
+@versioned('txn', 'txn_part', 'txn_part_tag', 'category')
+def get_transactions_trend():
+    opt = request.args
+    filters = _transaction_filter_values(opt)
+    time_unit = v_dict_entry(opt, 'time_unit', vv=enumv(options=['year', 'month', 'day']))
+    # Number of time units averaged by the moving average.
+    window = v_dict_entry(opt, 'window', vv=intv(min_val=1, max_val=1000, parse_from_str=True), optional=True) or 3
+
+    if analytics.engine is not None:
+        dt_from, dt_to, dataset, categories, category_subtrees, tags = filters
+        trend = analytics.engine.trend(
+            dt_from=dt_from,
+            dt_to=dt_to,
+            dataset=dataset,
+            categories=_engine_categories(categories, category_subtrees),
+            tags=tags,
+            time_unit=time_unit,
+            window=window,
+        )
+    else:
+        query = _trend_query(_transaction_filters_cond(*filters), time_unit, window)
+        trend = fetch_all_as_dict(c=get_db().cursor(), **query)
+    return {
+        "trend": trend,
+    }
+
+
+def _trend_query(cond: Cond, time_unit: str, window: int):
+    bucket = {
+        'year': 'txn.year_month / 100',
+        'month': 'txn.year_month',
+        'day': 'txn.day',
+    }[time_unit]
+    amount = 'SUM(txn_part.amount)'
+    # Frame bounds can't be parameters; the window is a validated integer.
+    window_frame = f'ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW'
+    # The windows are over the time units that have any parts, like the analytics engine's.
+    return dict(
+        tables=(
+            Table('txn'),
+        ),
+        cols=(
+            Column(_time_unit_label(time_unit, bucket), 'time_unit'),
+            Column(amount, 'amount'),
+            Column(f'SUM({amount}) OVER (ORDER BY {bucket})', 'balance'),
+            Column(f'AVG({amount}) OVER (ORDER BY {bucket} {window_frame})', 'moving_average'),
+            Column(f'{amount} - LAG({amount}) OVER (ORDER BY {bucket})', 'change'),
+        ),
+        joins=(
+            Join(JoinMethod.inner, Table('txn_part'), 'txn_part.txn = txn.id'),
+        ),
+        where=cond,
+        group_by=bucket,
+        order_by=bucket,
+    )
+
+
+def _category_cond(expr: str, categories: List[int], category_subtrees: List[int]):
+    if not category_subtrees:
+        return Cond.any_of(expr, categories)
+    subtree_cond = category_tree.subtree_cond(expr, category_subtrees)
+    if not categories:
+        return subtree_cond
+    exact_cond = Cond.any_of(expr, categories)
+    return Cond(f"({exact_cond.expr}) OR ({subtree_cond.expr})", *exact_cond.params, *subtree_cond.params)
+
+
+def _roll_up_analysis(analysis: List[Dict]):
+    tree = category_cache.get()
+    # Roll up each time unit separately; without a time unit, there's a single group.
+    groups: Dict[Optional[str], Dict[int, int]] = {}
+    rolled = []
+    for pt in analysis:
+        category_id = pt['category_id']
+        if category_id is None:
+            # Uncategorised amounts have no ancestors.
+            rolled.append({**pt, "category_name": None})
+        else:
+            groups.setdefault(pt.get('time_unit'), {})[category_id] = pt['combined_amount']
+    for unit, totals in groups.items():
+        for cat, total in category_tree.roll_up(tree.categories, totals):
+            pt = {
+                "category_id": cat.id,
+                "category_name": cat.name,
+                "depth": cat.depth,
+                "combined_amount": total,
+            }
+            if unit is not None:
+                pt["time_unit"] = unit
+            rolled.append(pt)
+    return rolled
+
+
+def _engine_categories(categories: List[int], category_subtrees: List[int]) -> Optional[Set[int]]:
+    """
+    The IDs of the selected categories and of the categories in the selected subtrees, or None if none are selected.
+    """
+    if not categories and not category_subtrees:
+        return None
+    tree = category_cache.get()
+    selected = set(categories)
+    for root in category_subtrees:
+        if root in tree.by_id:
+            root = tree.by_id[root]
+            selected.update(cat.id for cat in tree.categories if root.set_start <= cat.set_start <= root.set_end)
+    return selected
+
+
+def _engine_analysis(
+        dt_from: Optional[datetime],
+        dt_to: Optional[datetime],
+        split_by: str,
+        time_unit: str,
+        categories: List[int],
+        category_subtrees: List[int],
+        tags: List[int],
+):
+    analysis = analytics.engine.analyse(
+        dt_from=dt_from,
+        dt_to=dt_to,
+        split_by_category=split_by != 'none',
+        time_unit=time_unit,
+        categories=_engine_categories(categories, category_subtrees),
+        tags=tags,
+    )
+    if split_by == 'category':
+        tree = category_cache.get()
+        # Same shape as the SQL queries, which name the category instead.
+        for pt in analysis:
+            category_id = pt.pop('category_id')
+            pt['category_name'] = None if category_id is None else tree.by_id[category_id].name
+    return analysis
+
+
+def _epoch(dt: datetime) -> int:
+    return int(dt.timestamp())
+
+
+def _day(dt: datetime) -> int:
+    # Timestamps from requests are in UTC, like the days of transactions.
+    return int(dt.strftime('%Y%m%d'))
+
+
+def _time_unit_label(time_unit: str, bucket: str) -> str:
+    """
+    Formats an integer bucket (YYYY, YYYYMM or YYYYMMDD) as YYYY, YYYY-MM or YYYY-MM-DD.
+    """
+    if time_unit == 'year':
+        return f"printf('%04d', {bucket})"
+    if time_unit == 'month':
+        return f"printf('%04d-%02d', ({bucket}) / 100, ({bucket}) % 100)"
+    return f"printf('%04d-%02d-%02d', ({bucket}) / 10000, ({bucket}) / 100 % 100, ({bucket}) % 100)"
+
+
+def _is_start_of_day(dt: Optional[datetime]):
+    return dt is None or dt.time() == time.min
+
+
+def _is_end_of_day(dt: Optional[datetime]):
+    return dt is None or dt.time() >= time(23, 59, 59)
+
+
+def _rollup_analysis_query(
+        dt_from: Optional[datetime],
+        dt_to: Optional[datetime],
+        split_by: str,
+        time_unit: str,
+        categories: List[int],
+        category_subtrees: List[int],
+        tags: List[int],
+):
+    # The rollup tables hold positive amounts per day, so they can answer any query whose time range covers whole days.
+    columns = [
+        Column('SUM(rollup.amount)', 'combined_amount'),
+    ]
+    group_by = []
+
+    if split_by == 'category':
+        columns.append(Column('category.name', 'category_name'))
+        group_by.append('category.id')
+    elif split_by == 'category_tree':
+        columns.append(Column('category.id', 'category_id'))
+        group_by.append('category.id')
+
+    if time_unit != 'none':
+        bucket = f"rollup.day / {DAY_DIVISORS[time_unit]}"
+        columns.append(Column(_time_unit_label(time_unit, bucket), 'time_unit'))
+        group_by.append(bucket)
+
+    cond = Cond('rollup.amount > 0')
+    if dt_from is not None:
+        cond += Cond("rollup.day >= ?", _day(dt_from))
+    if dt_to is not None:
+        cond += Cond("rollup.day <= ?", _day(dt_to))
+    if categories or category_subtrees:
+        cond += _category_cond("NULLIF(rollup.category, 0)", categories, category_subtrees)
+    if tags:
+        cond += Cond("rollup.tag = ?", tags[0])
+
+    return dict(
+        tables=(
+            Table('txn_rollup_tag' if tags else 'txn_rollup_category', 'rollup'),
+        ),
+        cols=columns,
+        joins=(
+            Join(JoinMethod.left, Table('category'), 'rollup.category = category.id'),
+        ),
+        where=cond,
+        group_by=','.join(group_by),
+    )
+
+
+def _analysis_query(
+        dt_from: Optional[datetime],
+        dt_to: Optional[datetime],
+        split_by: str,
+        time_unit: str,
+        categories: List[int],
+        category_subtrees: List[int],
+        tags: List[int],
+):
     columns = [
         Column('SUM(txn_part.amount)', 'combined_amount'),
     ]
@@ -52,74 +517,89 @@ def get_transactions_analysis():
     if split_by == 'category':
         columns.append(Column('category.name', 'category_name'))
         group_by.append('category.id')
+    elif split_by == 'category_tree':
+        columns.append(Column('category.id', 'category_id'))
+        group_by.append('category.id')
 
     if time_unit != 'none':
         if time_unit == 'year':
-            time_unit_fmt = '%Y'
+            bucket = 'txn.year_month / 100'
         elif time_unit == 'month':
-            time_unit_fmt = '%Y-%m'
+            bucket = 'txn.year_month'
         elif time_unit == 'day':
-            time_unit_fmt = '%Y-%m-%d'
+            bucket = 'txn.day'
         else:
             assert False
-        columns.append(Column(f"strftime('{time_unit_fmt}', txn.timestamp)", 'time_unit'))
-        group_by.append(f"strftime('{time_unit_fmt}', txn.timestamp)")
+        columns.append(Column(_time_unit_label(time_unit, bucket), 'time_unit'))
+        group_by.append(bucket)
 
     cond = Cond('txn_part.amount > 0')
     if dt_from is not None:
-        cond += Cond("txn.timestamp >= ?", dt_from)
+        cond += Cond("txn.timestamp >= ?", _epoch(dt_from))
     if dt_to is not None:
-        cond += Cond("txn.timestamp <= ?", dt_to)
-    if categories:
-        cond += Cond(f"txn_part.category IN ({','.join(map(str, categories))})")
+        cond += Cond("txn.timestamp <= ?", _epoch(dt_to))
+    if categories or category_subtrees:
+        cond += _category_cond("txn_part.category", categories, category_subtrees)
     if tags:
-        cond += Cond(f"txn_part.id IN (SELECT txn_part FROM txn_part_tag WHERE tag IN ({','.join(map(str, tags))}))")
+        cond += Cond("txn_part.id IN (SELECT txn_part FROM txn_part_tag WHERE tag IN (SELECT value FROM json_each(?)))", json.dumps(tags))
 
-    return {
-        "analysis": fetch_all_as_dict(
-            c=get_db().cursor(),
-            tables=(
-                Table('txn_part'),
-            ),
-            cols=columns,
-            joins=(
-                Join(JoinMethod.left, Table('txn'), 'txn_part.txn = txn.id'),
-                Join(JoinMethod.left, Table('category'), 'txn_part.category = category.id'),
-            ),
-            where=cond,
-            group_by=','.join(group_by),
+    return dict(
+        tables=(
+            Table('txn_part'),
         ),
-    }
+        cols=columns,
+        joins=(
+            Join(JoinMethod.left, Table('txn'), 'txn_part.txn = txn.id'),
+            Join(JoinMethod.left, Table('category'), 'txn_part.category = category.id'),
+        ),
+        where=cond,
+        group_by=','.join(group_by),
+    )
 
 
 @transaction_api.route("/transaction/<transaction>", methods=['PATCH'])
 def update_transaction(**args):
     transaction = v_dict_entry(args, 'transaction', vv=intv(min_val=0, parse_from_str=True))
-    opt = require_json_object_body()
-    comment = v_dict_entry(opt, 'comment', optional=True, vv=strv())
-    timestamp = v_dict_entry(opt, 'timestamp', optional=True, vv=timestampv())
-    description = v_dict_entry(opt, 'description', optional=True, vv=strv())
-    amount = v_dict_entry(opt, 'amount', optional=True, vv=intv())
-
     require_changed_row(patch_row(
         c=get_db().cursor(),
         table='txn',
-        values=(
-            ('malformed', False),
-            ('comment', comment),
-            ('timestamp', timestamp),
-            ('description', description),
-            ('amount', amount),
-        ),
+        values=transaction_patch_values(require_json_object_body()),
         cond=Cond('id = ?', transaction),
     ))
     return {}
 
 
+def transaction_patch_values(opt: Dict):
+    """
+    Validates the fields of a transaction update, returning the columns to pass to patch_row.
+    """
+    return (
+        ('malformed', False),
+        ('comment', v_dict_entry(opt, 'comment', optional=True, vv=strv())),
+        ('timestamp', v_dict_entry(opt, 'timestamp', optional=True, vv=timestampv(as_epoch=True))),
+        ('description', v_dict_entry(opt, 'description', optional=True, vv=strv())),
+        ('amount', v_dict_entry(opt, 'amount', optional=True, vv=intv())),
+    )
+
+
 @transaction_api.route("/transaction/<transaction>", methods=['DELETE'])
 def delete_transaction(**args):
     transaction = v_dict_entry(args, 'transaction', vv=intv(min_val=0, parse_from_str=True))
-    c = get_db().cursor()
-    c.execute("DELETE FROM txn WHERE id = ?", (transaction,))
-    require_changed_row(c.rowcount)
+    require_changed_row(delete_transactions(get_db().cursor(), [transaction]))
     return {}
+
+
+def delete_transactions(c: Cursor, transactions: List[int]) -> int:
+    """
+    Deletes transactions along with their parts, returning how many transactions were deleted.
+    """
+    ids = json.dumps(transactions)
+    # Remove the parts too so that they don't linger as orphans in listings and analysis totals.
+    c.execute(
+        "DELETE FROM txn_part_tag WHERE txn_part IN"
+        " (SELECT id FROM txn_part WHERE txn IN (SELECT value FROM json_each(?)))",
+        (ids,),
+    )
+    c.execute("DELETE FROM txn_part WHERE txn IN (SELECT value FROM json_each(?))", (ids,))
+    c.execute("DELETE FROM txn WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+    return c.rowcount
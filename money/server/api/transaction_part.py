@@ -1,8 +1,12 @@
+import json
+from typing import Dict
+
 from flask import Blueprint
 
 from server.api._common import get_db
-from server.sql import fetch_all_as_dict, Column, Join, JoinMethod, Cond, require_changed_row, patch_row, Table
-from server.validation import require_json_object_body, v_dict_entry, strv, intv
+from server.api._http_cache import versioned
+from server.sql import execute_select, Column, Join, JoinMethod, Cond, require_changed_row, patch_row, Table
+from server.validation import require_json_object_body, v_dict_entry, strv, intv, v_list, listv
 
 transaction_part_api = Blueprint('transaction_part_api', __name__)
 
@@ -10,15 +14,10 @@ transaction_part_api = Blueprint('transaction_part_api', __name__)
 @transaction_part_api.route("/transaction/<transaction>/parts", methods=['POST'])
 def create_transaction_part(**args):
     transaction = v_dict_entry(args, 'transaction', vv=intv(min_val=0, parse_from_str=True))
-    opt = require_json_object_body()
-    comment = v_dict_entry(opt, 'comment', optional='', vv=strv())
-    amount = v_dict_entry(opt, 'amount', vv=intv(min_val=0))
-    category = v_dict_entry(opt, 'category', optional=True, vv=intv())
-
     c = get_db().cursor()
     c.execute(
         "INSERT INTO txn_part (txn, comment, amount, category) VALUES (?, ?, ?, ?)",
-        (transaction, comment, amount, category)
+        (transaction, *new_part_values(require_json_object_body()))
     )
     return {
         "id": c.lastrowid,
@@ -26,10 +25,12 @@ def create_transaction_part(**args):
 
 
 @transaction_part_api.route("/transaction/<transaction>/parts", methods=['GET'])
+@versioned('txn_part', 'txn_part_tag', 'category', 'tag')
 def get_transaction_parts(**args):
     transaction = v_dict_entry(args, 'transaction', vv=intv(min_val=0, parse_from_str=True))
-    parts = fetch_all_as_dict(
-        c=get_db().cursor(),
+    c = get_db().cursor()
+    execute_select(
+        c=c,
         tables=(
             Table('txn_part'),
         ),
@@ -39,8 +40,7 @@ def get_transaction_parts(**args):
             Column('txn_part.amount', 'amount'),
             Column('category.id', 'category_id'),
             Column('category.name', 'category_name'),
-            Column("GROUP_CONCAT(tag.id, '\1')", 'tag_ids'),
-            Column("GROUP_CONCAT(tag.name, '\1')", 'tag_names'),
+            Column("json_group_array(json_object('id', tag.id, 'name', tag.name)) FILTER (WHERE tag.id IS NOT NULL)", 'tags'),
         ),
         joins=(
             Join(JoinMethod.left, Table('category'), 'txn_part.category = category.id'),
@@ -50,26 +50,19 @@ def get_transaction_parts(**args):
         where=Cond('txn = ?', transaction),
         group_by="txn_part.id",
     )
-    for t in parts:
-        category_id = t.pop('category_id')
-        category_name = t.pop('category_name')
-        t['category'] = None if category_id is None else {
-            "id": category_id,
-            "name": category_name,
+    parts = [
+        {
+            "id": part_id,
+            "comment": comment,
+            "amount": amount,
+            "category": None if category_id is None else {
+                "id": category_id,
+                "name": category_name,
+            },
+            "tags": json.loads(tags),
         }
-
-        raw_tag_ids = t.pop('tag_ids')
-        raw_tag_names = t.pop('tag_names')
-        if not raw_tag_ids:
-            t['tags'] = []
-        else:
-            t['tags'] = [
-                {"id": tid, "name": tname}
-                for tid, tname in zip(
-                    map(int, raw_tag_ids.split('\1')),
-                    raw_tag_names.split('\1'),
-                )
-            ]
+        for part_id, comment, amount, category_id, category_name, tags in c
+    ]
     return {
         "parts": parts,
     }
@@ -78,19 +71,74 @@ def get_transaction_parts(**args):
 @transaction_part_api.route("/transaction_part/<part>", methods=['PATCH'])
 def update_transaction_part(**args):
     part = v_dict_entry(args, 'part', vv=intv(min_val=0, parse_from_str=True))
-    opt = require_json_object_body()
-    comment = v_dict_entry(opt, 'comment', optional=True, vv=strv())
-    amount = v_dict_entry(opt, 'amount', optional=True, vv=intv())
-    category = v_dict_entry(opt, 'category', vv=intv(min_val=0), nullable=True, optional=True)
-
     require_changed_row(patch_row(
         c=get_db().cursor(),
         table='txn_part',
-        values=(
-            ('comment', comment),
-            ('amount', amount),
-            ('category', category),
-        ),
+        values=part_patch_values(require_json_object_body()),
         cond=Cond('id = ?', part),
     ))
     return {}
+
+
+def new_part_values(opt: Dict):
+    """
+    Validates the fields of a new part, returning its comment, amount and category.
+    """
+    comment = v_dict_entry(opt, 'comment', optional='', vv=strv())
+    amount = v_dict_entry(opt, 'amount', vv=intv(min_val=0))
+    category = v_dict_entry(opt, 'category', optional=True, vv=intv())
+    return comment, amount, category
+
+
+def part_patch_values(opt: Dict):
+    """
+    Validates the fields of a part update, returning the columns to pass to patch_row.
+    """
+    return (
+        ('comment', v_dict_entry(opt, 'comment', optional=True, vv=strv())),
+        ('amount', v_dict_entry(opt, 'amount', optional=True, vv=intv())),
+        ('category', v_dict_entry(opt, 'category', vv=intv(min_val=0), nullable=True, optional=True)),
+    )
+
+
+def _tag_assignment():
+    opt = require_json_object_body()
+    parts = v_list(v_dict_entry(opt, 'parts', vv=listv()), 'parts', vv=intv(min_val=0))
+    tags = v_list(v_dict_entry(opt, 'tags', vv=listv()), 'tags', vv=intv(min_val=0))
+    return json.dumps(parts), json.dumps(tags)
+
+
+@transaction_part_api.route("/transaction_parts/tags", methods=['POST'])
+def add_transaction_part_tags():
+    parts, tags = _tag_assignment()
+    c = get_db().cursor()
+    # Every given tag is attached to every given part; pairs that already exist are left as they are, and unknown parts
+    # or tags are skipped.
+    c.execute(
+        """
+            INSERT OR IGNORE INTO txn_part_tag (txn_part, tag, comment)
+            SELECT txn_part.id, tag.id, ''
+            FROM txn_part, tag
+            WHERE txn_part.id IN (SELECT value FROM json_each(?)) AND tag.id IN (SELECT value FROM json_each(?))
+        """,
+        (parts, tags)
+    )
+    return {
+        "added": c.rowcount,
+    }
+
+
+@transaction_part_api.route("/transaction_parts/tags", methods=['DELETE'])
+def remove_transaction_part_tags():
+    parts, tags = _tag_assignment()
+    c = get_db().cursor()
+    c.execute(
+        """
+            DELETE FROM txn_part_tag
+            WHERE txn_part IN (SELECT value FROM json_each(?)) AND tag IN (SELECT value FROM json_each(?))
+        """,
+        (parts, tags)
+    )
+    return {
+        "removed": c.rowcount,
+    }
@@ -0,0 +1,112 @@
+import json
+from sqlite3 import Cursor, Connection
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar, Generic, Sequence
+
+from server.api._common import get_db
+
+T = TypeVar('T')
+
+# (version, time of last change in seconds since the epoch) of a table.
+TableVersion = Tuple[int, int]
+
+
+def table_versions(c: Cursor, tables: Sequence[str]) -> Dict[str, TableVersion]:
+    """
+    Reads the current data versions of `tables`, which the database bumps on every change to them.
+    """
+    c.execute(
+        "SELECT name, version, modified FROM data_version WHERE name IN (SELECT value FROM json_each(?))",
+        (json.dumps(tables),)
+    )
+    return {name: (version, modified) for name, version, modified in c.fetchall()}
+
+
+class TableCache(Generic[T]):
+    """
+    Caches the result of `load` until any of `tables` changes, according to their data versions. As the versions are
+    kept in the database, changes committed by any connection or process are noticed.
+    """
+
+    def __init__(self, tables: Sequence[str], load: Callable[[Cursor], T]):
+        self._tables = tuple(tables)
+        self._load = load
+        self._lock = Lock()
+        self._versions: Optional[Dict[str, TableVersion]] = None
+        self._data: Optional[T] = None
+
+    def get(self, db: Optional[Connection] = None) -> T:
+        """
+        Returns the data as of the current versions of the tables, which must not be mutated. Reads from the current
+        request's connection unless `db` is given.
+        """
+        if db is None:
+            db = get_db()
+        versions = table_versions(db.cursor(), self._tables)
+        with self._lock:
+            if versions == self._versions:
+                return self._data
+        data = self._load(db.cursor())
+        # Data loaded within a write transaction may include changes that are later rolled back, so it's only kept for
+        # the current request.
+        if not db.in_transaction:
+            with self._lock:
+                self._versions = versions
+                self._data = data
+        return data
+
+
+class Category:
+    __slots__ = ('id', 'name', 'comment', 'set_start', 'set_end', 'depth')
+
+    def __init__(self, id: int, name: str, comment: str, set_start: int, set_end: int, depth: int):
+        self.id = id
+        self.name = name
+        self.comment = comment
+        self.set_start = set_start
+        self.set_end = set_end
+        self.depth = depth
+
+
+class CategoryTree:
+    def __init__(self, categories: List[Category]):
+        # Ordered by set_start, i.e. a pre-order traversal of the tree.
+        self.categories = categories
+        self.by_id: Dict[int, Category] = {cat.id: cat for cat in categories}
+
+
+def _load_category_tree(c: Cursor) -> CategoryTree:
+    c.execute("SELECT id, name, comment, set_start, set_end FROM category ORDER BY set_start")
+    categories = []
+    # Ends of the ancestors of the current node; a node is outside an ancestor once it starts after the ancestor's end.
+    open_ends = []
+    for id, name, comment, set_start, set_end in c.fetchall():
+        while open_ends and open_ends[-1] < set_start:
+            open_ends.pop()
+        categories.append(Category(id, name, comment, set_start, set_end, len(open_ends)))
+        open_ends.append(set_end)
+    return CategoryTree(categories)
+
+
+class Tag:
+    __slots__ = ('id', 'name', 'comment')
+
+    def __init__(self, id: int, name: str, comment: str):
+        self.id = id
+        self.name = name
+        self.comment = comment
+
+
+class TagList:
+    def __init__(self, tags: List[Tag]):
+        self.tags = tags
+        self.by_id: Dict[int, Tag] = {tag.id: tag for tag in tags}
+
+
+def _load_tag_list(c: Cursor) -> TagList:
+    c.execute("SELECT id, name, comment FROM tag")
+    return TagList([Tag(*row) for row in c.fetchall()])
+
+
+category_cache: TableCache[CategoryTree] = TableCache(('category',), _load_category_tree)
+tag_cache: TableCache[TagList] = TableCache(('tag',), _load_tag_list)
@@ -0,0 +1,190 @@
+"""
+The category tree is stored as nested sets, but with gaps between the numbers so that nodes can be added and subtrees
+moved without shifting every node after them. A new node takes a small slice of the gap at its position, next to the
+node it's placed relative to, and leaves the rest free on the side where the next insert nearby is likely to go (e.g.
+after it, when appending siblings one after another). Each insert at the same position therefore only shrinks the gap
+there by 1/ALLOCATION_FRACTION. When there is no room left in a gap, the whole tree is renumbered with spacing of
+(SET_UPPER - SET_LOWER) / (2 * categories), so hundreds of inserts at any one position fit between renumberings, which
+each cost O(categories).
+"""
+
+import json
+from sqlite3 import Cursor
+from typing import Tuple, List, Sequence, Dict
+
+from werkzeug.exceptions import BadRequest
+
+from server.cache import Category
+from server.sql import require_one, Cond
+
+# Exclusive bounds of all set boundaries.
+SET_LOWER = 0
+SET_UPPER = 1 << 62
+# An insert or move uses this fraction (as 1/n) of the free numbers at its position.
+ALLOCATION_FRACTION = 16
+
+
+def _boundary_after(c: Cursor, point: int) -> int:
+    c.execute(
+        "SELECT (SELECT MIN(set_start) FROM category WHERE set_start > ?), (SELECT MIN(set_end) FROM category WHERE set_end > ?)",
+        (point, point)
+    )
+    return min((b for b in c.fetchone() if b is not None), default=SET_UPPER)
+
+
+def _boundary_before(c: Cursor, point: int) -> int:
+    c.execute(
+        "SELECT (SELECT MAX(set_start) FROM category WHERE set_start < ?), (SELECT MAX(set_end) FROM category WHERE set_end < ?)",
+        (point, point)
+    )
+    return max((b for b in c.fetchone() if b is not None), default=SET_LOWER)
+
+
+def get_bounds(c: Cursor, category: int) -> Tuple[int, int]:
+    c.execute("SELECT set_start, set_end FROM category WHERE id = ?", (category,))
+    return require_one(c.fetchall())
+
+
+def _free_range(c: Cursor, target: int, mode: str) -> Tuple[int, int]:
+    """
+    Returns the exclusive bounds of the unused numbers at the position described by `mode` relative to `target`.
+    """
+    target_start, target_end = get_bounds(c, target)
+    if mode == 'first':
+        return target_start, _boundary_after(c, target_start)
+    if mode == 'after':
+        return target_end, _boundary_after(c, target_end)
+    if mode == 'before':
+        return _boundary_before(c, target_start), target_start
+    raise BadRequest('Invalid mode')
+
+
+def renumber(c: Cursor):
+    c.execute("SELECT id, set_start, set_end FROM category")
+    boundaries = []
+    for id, set_start, set_end in c.fetchall():
+        boundaries.append((set_start, id, 'set_start'))
+        boundaries.append((set_end, id, 'set_end'))
+    boundaries.sort()
+    # Spread over all the available numbers, so the gaps are as large as they can be.
+    spacing = (SET_UPPER - SET_LOWER) // (len(boundaries) + 1)
+    for col in ('set_start', 'set_end'):
+        c.executemany(
+            f"UPDATE category SET {col} = ? WHERE id = ?",
+            [(SET_LOWER + (i + 1) * spacing, id) for i, (_, id, b_col) in enumerate(boundaries) if b_col == col]
+        )
+
+
+def _allocate(lo: int, hi: int, mode: str, count: int) -> List[int]:
+    """
+    Returns `count` evenly spaced numbers for new boundaries in a slice of the free range between `lo` and `hi`
+    (exclusive), which must hold more than `count` numbers. The slice is next to the neighbour the boundaries are placed
+    relative to: the target when inserting after it, and the following boundary when inserting first or before. The
+    rest of the range stays free for the next insert after the new node, or first or before the new node, respectively.
+    """
+    width = max((hi - lo) // ALLOCATION_FRACTION, count + 1)
+    if mode == 'after':
+        hi = lo + width
+    else:
+        lo = hi - width
+    step = (hi - lo) // (count + 1)
+    return [lo + (i + 1) * step for i in range(count)]
+
+
+def insert(c: Cursor, name: str, target: int, mode: str) -> int:
+    lo, hi = _free_range(c, target, mode)
+    if hi - lo < 3:
+        renumber(c)
+        lo, hi = _free_range(c, target, mode)
+    set_start, set_end = _allocate(lo, hi, mode, 2)
+    return _insert(c, name, set_start, set_end)
+
+
+def insert_root(c: Cursor, name: str) -> int:
+    # Leave room on both sides and inside the root.
+    third = (SET_UPPER - SET_LOWER) // 3
+    return _insert(c, name, SET_LOWER + third, SET_UPPER - third)
+
+
+def _insert(c: Cursor, name: str, set_start: int, set_end: int) -> int:
+    # TODO Handle unique
+    c.execute(
+        "INSERT INTO category (name, comment, set_start, set_end) VALUES (?, '', ?, ?)",
+        (name, set_start, set_end)
+    )
+    return c.lastrowid
+
+
+def _plan_move(c: Cursor, category: int, target: int, mode: str):
+    set_start, set_end = get_bounds(c, category)
+    target_start, _ = get_bounds(c, target)
+    if set_start <= target_start <= set_end:
+        raise BadRequest('Cannot move a category into itself')
+    c.execute(
+        "SELECT id, set_start, set_end FROM category WHERE set_start >= ? AND set_end <= ?",
+        (set_start, set_end)
+    )
+    subtree = c.fetchall()
+    boundaries = sorted(b for _, s, e in subtree for b in (s, e))
+    lo, hi = _free_range(c, target, mode)
+    return subtree, boundaries, lo, hi
+
+
+def move(c: Cursor, category: int, target: int, mode: str):
+    subtree, boundaries, lo, hi = _plan_move(c, category, target, mode)
+    if hi - lo <= len(boundaries):
+        renumber(c)
+        subtree, boundaries, lo, hi = _plan_move(c, category, target, mode)
+        if hi - lo <= len(boundaries):
+            raise BadRequest('Subtree is too large to move')
+
+    # The relative order of the subtree's boundaries is kept, but they are respaced evenly in the destination.
+    position = dict(zip(boundaries, _allocate(lo, hi, mode, len(boundaries))))
+    c.executemany(
+        "UPDATE category SET set_start = ?, set_end = ? WHERE id = ?",
+        [(position[s], position[e], id) for id, s, e in subtree]
+    )
+
+
+def delete(c: Cursor, category: int):
+    set_start, set_end = get_bounds(c, category)
+    subtree = "SELECT id FROM category WHERE set_start >= ? AND set_end <= ?"
+    c.execute(f"UPDATE txn_part SET category = NULL WHERE category IN ({subtree})", (set_start, set_end))
+    c.execute(f"UPDATE rule SET category = NULL WHERE category IN ({subtree})", (set_start, set_end))
+    c.execute(f"DELETE FROM category WHERE id IN ({subtree})", (set_start, set_end))
+
+
+def subtree_cond(expr: str, categories: List[int]) -> Cond:
+    """
+    Matches `expr` against the IDs of the given categories and all of their descendants.
+    """
+    return Cond(
+        f"{expr} IN (SELECT node.id FROM category AS root, category AS node"
+        " WHERE root.id IN (SELECT value FROM json_each(?))"
+        " AND node.set_start BETWEEN root.set_start AND root.set_end)",
+        json.dumps(categories),
+    )
+
+
+def roll_up(categories: Sequence[Category], totals: Dict[int, int]) -> List[Tuple[Category, int]]:
+    """
+    Adds the totals of every category to those of all its ancestors, in a single pass over `categories`, which must be
+    in set_start order. Returns the categories with a non-zero total, in the same order.
+    """
+    rolled = []
+    # Indices into `rolled` of the ancestors of the current category, and their totals so far.
+    stack: List[int] = []
+    for cat in categories:
+        while stack and len(stack) > cat.depth:
+            _close(rolled, stack)
+        stack.append(len(rolled))
+        rolled.append([cat, totals.get(cat.id, 0)])
+    while stack:
+        _close(rolled, stack)
+    return [(cat, total) for cat, total in rolled if total]
+
+
+def _close(rolled: List[List], stack: List[int]):
+    closed = stack.pop()
+    if stack:
+        rolled[stack[-1]][1] += rolled[closed][1]
@@ -1,12 +1,19 @@
 import sqlite3
 from os import listdir
 from os.path import join
+from typing import Callable, Iterable, Tuple
 
 
-def prepare_database(path: str, app: str, schemas_dir: str):
+def prepare_database(path: str, app: str, schemas_dir: str, functions: Iterable[Tuple[str, int, Callable]] = ()):
+    """
+    Creates or migrates the database. `functions` are (name, number of arguments, implementation) of SQL functions
+    that schema scripts may call.
+    """
     versions = sorted(int(v) for v in listdir(schemas_dir))
 
     db = sqlite3.connect(path)
+    for name, num_params, func in functions:
+        db.create_function(name, num_params, func)
     c = db.cursor()
 
     c.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'eucalyptus' AND type = 'table'")
@@ -0,0 +1,41 @@
+from typing import List, Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Picks `threshold` of the points (xs[i], ys[i]), which must be ordered by x, that keep the shape of the line through
+    them, using Largest-Triangle-Three-Buckets. Returns the indices of the picked points in order; the first and last
+    points are always picked. If there are no more than `threshold` points, all are picked.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    # The points between the first and the last are split into threshold - 2 buckets, each contributing one point.
+    bucket_size = (n - 2) / (threshold - 2)
+    picked = [0]
+    prev = 0
+    for b in range(threshold - 2):
+        start = int(b * bucket_size) + 1
+        end = int((b + 1) * bucket_size) + 1
+        # The third corner of the triangles is the average of the next bucket (just the last point for the last one).
+        next_start = end
+        next_end = min(int((b + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        prev_x = xs[prev]
+        prev_y = ys[prev]
+        best = start
+        best_area = -1.0
+        for i in range(start, end):
+            # Twice the area of the triangle, which orders them just the same.
+            area = abs((prev_x - avg_x) * (ys[i] - prev_y) - (prev_x - xs[i]) * (avg_y - prev_y))
+            if area > best_area:
+                best_area = area
+                best = i
+        picked.append(best)
+        prev = best
+    picked.append(n - 1)
+    return picked
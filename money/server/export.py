@@ -0,0 +1,146 @@
+import csv
+import json
+from io import StringIO
+from itertools import islice
+from time import gmtime, strftime
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_SUPPORTED = pa is not None
+
+# Number of rows fetched from the cursor and written out at a time, which bounds memory use regardless of the result.
+EXPORT_BATCH_SIZE = 1000
+# Parquet is columnar, so it's written in larger batches, each of which becomes one row group.
+PARQUET_ROW_GROUP_SIZE = 50000
+
+EXPORT_COLUMNS = (
+    'id',
+    'timestamp',
+    'description',
+    'comment',
+    'malformed',
+    'transaction_amount',
+    'combined_amount',
+    'categories',
+)
+
+# Fields of select_transaction_rows, in the order of EXPORT_COLUMNS.
+_SOURCE_FIELDS = (
+    'id',
+    '_ts:timestamp',
+    'description',
+    'comment',
+    'malformed',
+    'transaction_amount',
+    'combined_amount',
+    'combined_categories',
+)
+
+
+def _export_rows(fields: Sequence[str], rows: Iterable[Tuple]) -> Iterator[Tuple]:
+    indices = [fields.index(f) for f in _SOURCE_FIELDS]
+    for row in rows:
+        txn_id, timestamp, description, comment, malformed, txn_amount, amount, categories = (row[i] for i in indices)
+        yield txn_id, timestamp, description, comment, bool(malformed), txn_amount, amount, [c['name'] for c in categories]
+
+
+def _batches(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _iso(timestamp: int) -> str:
+    return strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(timestamp))
+
+
+def write_csv(fields: Sequence[str], rows: Iterable[Tuple]) -> Iterator[str]:
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue()
+    for batch in _batches(_export_rows(fields, rows), EXPORT_BATCH_SIZE):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(
+            (txn_id, _iso(timestamp), description, comment, int(malformed), txn_amount, amount, '; '.join(categories))
+            for txn_id, timestamp, description, comment, malformed, txn_amount, amount, categories in batch
+        )
+        yield buf.getvalue()
+
+
+def write_ndjson(fields: Sequence[str], rows: Iterable[Tuple]) -> Iterator[str]:
+    encode = json.JSONEncoder(check_circular=False, separators=(',', ':')).encode
+    for batch in _batches(_export_rows(fields, rows), EXPORT_BATCH_SIZE):
+        yield ''.join(
+            encode(dict(zip(EXPORT_COLUMNS, (row[0], _iso(row[1]), *row[2:])))) + '\n'
+            for row in batch
+        )
+
+
+class _ChunkSink:
+    """
+    Write-only file that keeps what's written to it until drained, so that a Parquet file can be streamed while it's
+    being written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def write_parquet(fields: Sequence[str], rows: Iterable[Tuple]) -> Iterator[bytes]:
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('s', tz='UTC')),
+        ('description', pa.string()),
+        ('comment', pa.string()),
+        ('malformed', pa.bool_()),
+        ('transaction_amount', pa.int64()),
+        ('combined_amount', pa.int64()),
+        ('categories', pa.list_(pa.string())),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    for batch in _batches(_export_rows(fields, rows), PARQUET_ROW_GROUP_SIZE):
+        columns = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# Content type and writer of each export format.
+EXPORT_FORMATS = {
+    'csv': ('text/csv', write_csv),
+    'ndjson': ('application/x-ndjson', write_ndjson),
+    'parquet': ('application/vnd.apache.parquet', write_parquet),
+}
@@ -0,0 +1,285 @@
+import json
+import multiprocessing
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import getenv, makedirs, remove, cpu_count, getpid
+from queue import Queue, Empty
+from shutil import copyfileobj
+from tempfile import mkstemp
+from threading import Lock, Thread
+from time import time
+from typing import Optional, BinaryIO, Tuple, Callable, Iterator, List, Set
+from uuid import uuid4
+
+from server.api._common import DATABASE, connect, write_connection
+from server.importer import ImportOptions, IMPORT_BATCH_SIZE, Fingerprinter, insert_rows, parse_row, parse_rows, \
+    read_csv_rows, batch_csv_rows
+from server.rules import rule_cache, apply_rules
+from server.sql import Cond
+
+# Where uploads are kept until their import jobs have ended.
+IMPORT_DIR = getenv('EUCALYPTUS_IMPORT_DIR', f'{DATABASE}-imports')
+
+# Bytes copied at a time when saving an upload.
+SPOOL_BUFFER_SIZE = 1024 * 1024
+
+# Processes that parse rows of uploads in parallel; with 1, rows are parsed by the import job's thread.
+IMPORT_PARSE_PROCESSES = int(getenv('EUCALYPTUS_IMPORT_PARSE_PROCESSES', str(cpu_count() or 1)))
+# How parse processes are started. The pool is created by the import job's thread, and forking the server from a
+# thread can copy locks held by its other threads; forkserver isn't available on every platform.
+PARSE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Statuses of jobs that haven't ended, and so are resumed when the server starts.
+UNFINISHED_STATUSES = ('queued', 'running', 'cancelling')
+
+# Seconds for which a job stays with the process that claimed it without renewing its lease, which it does with every
+# committed chunk. Other processes only take a job over once its lease has expired, e.g. as its process has crashed.
+JOB_LEASE_SECONDS = 60
+
+# Identifies this process as the owner of the jobs it runs; the PID alone could be reused after a restart.
+_OWNER_TOKEN = uuid4().hex
+
+
+def _owner() -> str:
+    # Looked up each time, as forked processes inherit the token.
+    return f'{getpid()}:{_OWNER_TOKEN}'
+
+
+def spool_upload(stream: BinaryIO) -> Tuple[str, int]:
+    """
+    Saves an upload to a new file, and returns its path and size.
+    """
+    makedirs(IMPORT_DIR, exist_ok=True)
+    fd, path = mkstemp(dir=IMPORT_DIR, suffix='.csv')
+    try:
+        with open(fd, 'wb') as f:
+            copyfileobj(stream, f, SPOOL_BUFFER_SIZE)
+            return path, f.tell()
+    except BaseException:
+        remove(path)
+        raise
+
+
+def create_import_job(c, dataset_id: int, path: str, size: int, opt: ImportOptions) -> int:
+    c.execute(
+        """
+            INSERT INTO import_job (dataset, status, path, options, size, offset, rows, malformed, skipped, created)
+            VALUES (?, 'queued', ?, ?, ?, 0, 0, 0, 0, ?)
+        """,
+        (dataset_id, path, json.dumps(vars(opt)), size, int(time()))
+    )
+    return c.lastrowid
+
+
+def _claim_job(db, job_id: int) -> bool:
+    """
+    Makes this process the owner of a job, if it's queued, or if its owner's lease has expired or its owner is this
+    process (whose worker runs one job at a time, so it has been interrupted). The check and the update are one
+    statement, so only one process can claim a job.
+    """
+    now = int(time())
+    owner = _owner()
+    c = db.execute(
+        """
+            UPDATE import_job
+            SET status = CASE status WHEN 'queued' THEN 'running' ELSE status END, owner = ?, lease_until = ?,
+                started = IFNULL(started, ?), updated = ?
+            WHERE id = ? AND (
+                status = 'queued'
+                OR status IN ('running', 'cancelling') AND (IFNULL(lease_until, 0) < ? OR owner = ?)
+            )
+        """,
+        (owner, now + JOB_LEASE_SECONDS, now, now, job_id, now, owner)
+    )
+    db.commit()
+    return c.rowcount == 1
+
+
+def _end_job(db, job_id: int, path: str, status: str, error: Optional[str] = None):
+    c = db.execute(
+        "UPDATE import_job SET status = ?, error = ?, updated = ?, lease_until = NULL WHERE id = ? AND owner = ?",
+        (status, error, int(time()), job_id, _owner())
+    )
+    db.commit()
+    if c.rowcount == 0:
+        # Taken over by another process, which ends it instead.
+        return
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _cancelled(db, job_id: int) -> bool:
+    return db.execute("SELECT status FROM import_job WHERE id = ?", (job_id,)).fetchone()[0] == 'cancelling'
+
+
+def _run_job(
+        job_id: int,
+        parse_batches: Callable[[Iterator, ImportOptions], Iterator[Tuple[List[Tuple], int]]],
+) -> bool:
+    """
+    Runs a job if this process can claim it. Returns whether it's being run by another process instead, in which case
+    it should be tried again once that process's lease could have expired.
+    """
+    with write_connection() as db:
+        if not _claim_job(db, job_id):
+            row = db.execute("SELECT status FROM import_job WHERE id = ?", (job_id,)).fetchone()
+            return row is not None and row[0] in UNFINISHED_STATUSES
+        dataset_id, source, status, path, options, offset = db.execute(
+            """
+                SELECT import_job.dataset, dataset.source, import_job.status, import_job.path, import_job.options,
+                    import_job.offset
+                FROM import_job
+                JOIN dataset ON dataset.id = import_job.dataset
+                WHERE import_job.id = ?
+            """,
+            (job_id,)
+        ).fetchone()
+        if status == 'cancelling':
+            _end_job(db, job_id, path, 'cancelled')
+            return False
+
+    opt = ImportOptions(**json.loads(options))
+    fingerprint = Fingerprinter(source)
+    with open(path, 'rb') as f:
+        rows = read_csv_rows(f)
+        if offset:
+            # Resuming: rows before the offset were committed already, but fingerprints depend on every earlier row.
+            for row, end in rows:
+                fingerprint(parse_row(row, opt))
+                if end >= offset:
+                    break
+
+        for parsed, offset in parse_batches(batch_csv_rows(rows, IMPORT_BATCH_SIZE), opt):
+            # Fingerprints depend on earlier rows, so they're assigned here, in the order of the file.
+            batch = [(*p, fingerprint(p)) for p in parsed]
+            # Writes wait for the writer connection, so other writers get their turn between chunks.
+            with write_connection() as db:
+                if _cancelled(db, job_id):
+                    # Chunks committed so far are kept.
+                    _end_job(db, job_id, path, 'cancelled')
+                    return False
+                c = db.cursor()
+                skipped = insert_rows(c, dataset_id, batch)
+                now = int(time())
+                c.execute(
+                    """
+                        UPDATE import_job
+                        SET offset = ?, rows = rows + ?, malformed = malformed + ?, skipped = skipped + ?, updated = ?,
+                            lease_until = ?
+                        WHERE id = ? AND owner = ?
+                    """,
+                    (
+                        offset, len(batch), sum(1 for r in batch if r[1]), skipped, now, now + JOB_LEASE_SECONDS,
+                        job_id, _owner(),
+                    )
+                )
+                if c.rowcount == 0:
+                    # The lease expired and another process has taken the job over, continuing from the last chunk
+                    # committed by this one.
+                    db.rollback()
+                    return False
+                db.commit()
+
+    with write_connection() as db:
+        if _cancelled(db, job_id):
+            _end_job(db, job_id, path, 'cancelled')
+            return False
+        c = db.cursor()
+        matched = apply_rules(c, rule_cache.get(db), Cond('txn.dataset = ?', dataset_id))
+        c.execute("UPDATE import_job SET matched = ? WHERE id = ? AND owner = ?", (matched, job_id, _owner()))
+        if c.rowcount == 0:
+            db.rollback()
+            return False
+        _end_job(db, job_id, path, 'done')
+    return False
+
+
+class ImportWorker:
+    """
+    Runs import jobs one at a time on a background thread, which is started when the first job is submitted. Rows are
+    parsed by a pool of processes, if configured with more than one, while earlier rows are being inserted.
+    """
+
+    def __init__(self, parse_processes: int):
+        self._queue = Queue()
+        # Jobs being run by other processes, which are tried again in case those processes stop.
+        self._waiting: Set[int] = set()
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+        self._parse_processes = parse_processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _parse_batches(self, batches: Iterator[Tuple[List[List[str]], int]], opt: ImportOptions):
+        if self._parse_processes <= 1:
+            for rows, end in batches:
+                yield parse_rows(rows, opt), end
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self._parse_processes, mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+            )
+        # Results are taken in the order the batches were submitted; only a few batches are parsed ahead of the
+        # inserts, which bounds memory use.
+        pending = deque()
+        try:
+            for rows, end in batches:
+                pending.append((self._pool.submit(parse_rows, rows, opt), end))
+                if len(pending) > 2 * self._parse_processes:
+                    future, end = pending.popleft()
+                    yield future.result(), end
+            while pending:
+                future, end = pending.popleft()
+                yield future.result(), end
+        finally:
+            # E.g. when the job has been cancelled.
+            for future, _ in pending:
+                future.cancel()
+
+    def submit(self, job_id: int):
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='import-worker', daemon=True)
+                self._thread.start()
+        self._queue.put(job_id)
+
+    def _run(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=JOB_LEASE_SECONDS if self._waiting else None)
+            except Empty:
+                for job_id in sorted(self._waiting):
+                    self._queue.put(job_id)
+                self._waiting.clear()
+                continue
+            try:
+                if _run_job(job_id, self._parse_batches):
+                    self._waiting.add(job_id)
+            except Exception as e:
+                traceback.print_exc()
+                with write_connection() as db:
+                    path = db.execute("SELECT path FROM import_job WHERE id = ?", (job_id,)).fetchone()[0]
+                    _end_job(db, job_id, path, 'failed', str(e))
+
+
+import_worker = ImportWorker(IMPORT_PARSE_PROCESSES)
+
+
+def resume_import_jobs():
+    """
+    Requeues jobs that were interrupted, e.g. by the server stopping. They continue after their last committed chunk,
+    once no other process holds a lease on them.
+    """
+    db = connect()
+    try:
+        jobs = [job_id for job_id, in db.execute(
+            "SELECT id FROM import_job WHERE status IN (SELECT value FROM json_each(?)) ORDER BY id",
+            (json.dumps(UNFINISHED_STATUSES),)
+        )]
+    finally:
+        db.close()
+    for job_id in jobs:
+        import_worker.submit(job_id)
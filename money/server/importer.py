@@ -0,0 +1,253 @@
+import csv
+import json
+import re
+from calendar import timegm
+from datetime import datetime, date
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import islice
+from sqlite3 import Cursor
+from time import time
+from typing import List, Tuple, Dict, BinaryIO, Iterator, Optional, Callable, Pattern
+
+from server.validation import parse_money_amount
+
+# Number of CSV rows parsed, written and committed at a time by import jobs.
+IMPORT_BATCH_SIZE = 5000
+
+
+# Distinct timestamp strings remembered per format; exports tend to have many rows per day.
+TIMESTAMP_CACHE_SIZE = 4096
+
+# Patterns of the fields of formats that timestamp_parser matches without strptime, i.e. when zero-padded.
+_FIXED_WIDTH_DIRECTIVES = {
+    'Y': '([0-9]{4})',
+    'm': '([0-9]{2})',
+    'd': '([0-9]{2})',
+    'H': '([0-9]{2})',
+    'M': '([0-9]{2})',
+    'S': '([0-9]{2})',
+}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class ImportOptions:
+    def __init__(
+            self,
+            *,
+            timestamp_column: int,
+            timestamp_format: str,
+            description_column: int,
+            amount_column: int,
+            credit_column: Optional[int] = None,
+    ):
+        self.timestamp_column = timestamp_column
+        self.timestamp_format = timestamp_format
+        self.description_column = description_column
+        # If there's a credit column, this is the debit column, and the amount is the debit minus the credit.
+        self.amount_column = amount_column
+        self.credit_column = credit_column
+
+
+def _fixed_width_pattern(fmt: str) -> Optional[Tuple[Pattern, List[str]]]:
+    # Returns a pattern for zero-padded timestamps in the format, and the directive of each of its groups, or None if
+    # the format has other directives.
+    pattern = ''
+    directives = []
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == '%':
+            directive = fmt[i + 1:i + 2]
+            if directive not in _FIXED_WIDTH_DIRECTIVES or directive in directives:
+                return None
+            pattern += _FIXED_WIDTH_DIRECTIVES[directive]
+            directives.append(directive)
+            i += 2
+        else:
+            pattern += re.escape(fmt[i])
+            i += 1
+    if not {'Y', 'm', 'd'} <= set(directives):
+        return None
+    return re.compile(pattern), directives
+
+
+@lru_cache(maxsize=64)
+def timestamp_parser(fmt: str) -> Callable[[str], int]:
+    """
+    Returns a function that parses timestamps in the strptime format `fmt` to seconds since the epoch, taking times
+    without a UTC offset to be in UTC. Results are the same as with strptime, but formats made of only %Y, %m, %d, %H,
+    %M and %S are matched with a regular expression when all fields are zero-padded, and recent results are remembered.
+    """
+
+    def parse_with_strptime(raw: str) -> int:
+        return timegm(datetime.strptime(raw, fmt).utctimetuple())
+
+    fixed = _fixed_width_pattern(fmt)
+    if fixed is None:
+        return lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)(parse_with_strptime)
+
+    pattern, directives = fixed
+    year, month, day = (directives.index(d) for d in ('Y', 'm', 'd'))
+    # Index, exclusive upper limit, and seconds per unit of each time field.
+    time_fields = [
+        (directives.index(d), limit, unit)
+        for d, limit, unit in (('H', 24, 3600), ('M', 60, 60), ('S', 60, 1))
+        if d in directives
+    ]
+
+    @lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+    def parse(raw: str) -> int:
+        match = pattern.fullmatch(raw)
+        if match is None:
+            # strptime might still accept it, e.g. if fields aren't zero-padded.
+            return parse_with_strptime(raw)
+        values = [int(v) for v in match.groups()]
+        # Like strptime, raises ValueError for dates that don't exist.
+        seconds = (date(values[year], values[month], values[day]).toordinal() - _EPOCH_ORDINAL) * 86400
+        for i, limit, unit in time_fields:
+            if values[i] >= limit:
+                raise ValueError(f'Invalid time in timestamp {raw!r}.')
+            seconds += values[i] * unit
+        return seconds
+
+    return parse
+
+
+def txn_fingerprint(source: int, timestamp: int, amount: int, description: str, occurrence: int) -> int:
+    """
+    Hashes what identifies a bank transaction, so that importing an overlapping export of the same source can skip
+    transactions that were imported already. `timestamp` is in seconds since the epoch, and `occurrence` counts
+    identical earlier rows in the same import, so that genuinely repeated transactions (e.g. two identical purchases
+    on one day) are not mistaken for duplicates of each other. Also registered as an SQL function for migrations.
+    """
+    normalised = '\x1f'.join((str(source), str(timestamp), str(amount), ' '.join(description.split()), str(occurrence)))
+    # Signed, so that it fits in an SQLite integer.
+    return int.from_bytes(blake2b(normalised.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def parse_row(row: List[str], opt: ImportOptions) -> Tuple:
+    raw = json.dumps(row)
+    malformed = False
+
+    try:
+        timestamp = timestamp_parser(opt.timestamp_format)(row[opt.timestamp_column])
+    except (IndexError, ValueError):
+        timestamp = int(time())
+        malformed = True
+
+    try:
+        description = row[opt.description_column]
+    except IndexError:
+        description = ''
+        malformed = True
+
+    try:
+        if opt.credit_column is None:
+            amount = -parse_money_amount(row[opt.amount_column])
+        else:
+            amount = _credit_minus_debit(row[opt.amount_column], row[opt.credit_column])
+    except (IndexError, ValueError):
+        amount = 0
+        malformed = True
+
+    return raw, malformed, timestamp, description, amount
+
+
+def _credit_minus_debit(debit: str, credit: str) -> int:
+    # Usually only one of them is filled in; a blank one counts as zero, but at least one has to have an amount.
+    if not debit.strip() and not credit.strip():
+        raise ValueError('Both debit and credit are blank.')
+    amount = 0
+    if debit.strip():
+        amount -= parse_money_amount(debit)
+    if credit.strip():
+        amount += parse_money_amount(credit)
+    return amount
+
+
+def parse_rows(rows: List[List[str]], opt: ImportOptions) -> List[Tuple]:
+    # Module level, so that it can be run in other processes.
+    return [parse_row(row, opt) for row in rows]
+
+
+def read_csv_rows(f: BinaryIO) -> Iterator[Tuple[List[str], int]]:
+    """
+    Reads CSV rows from the binary file `f`, along with the byte offset in it just after each row, from which reading
+    can later resume.
+    """
+    offset = f.tell()
+
+    def lines():
+        nonlocal offset
+        for line in iter(f.readline, b''):
+            offset += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+    # The reader consumes exactly the lines of each row before yielding it, so `offset` is then at its end.
+    for row in csv.reader(lines()):
+        yield row, offset
+
+
+def batch_csv_rows(rows: Iterator[Tuple[List[str], int]], size: int) -> Iterator[Tuple[List[List[str]], int]]:
+    """
+    Groups rows from read_csv_rows into lists of up to `size` rows, along with the byte offset after the last of them.
+    """
+    while True:
+        batch = []
+        end = None
+        for row, end in islice(rows, size):
+            batch.append(row)
+        if not batch:
+            return
+        yield batch, end
+
+
+class Fingerprinter:
+    """
+    Assigns fingerprints to parsed rows of one import, which have to be passed to it in the order of the file.
+    """
+
+    def __init__(self, source: int):
+        self.source = source
+        self._occurrences: Dict[Tuple, int] = {}
+
+    def __call__(self, parsed: Tuple) -> Optional[int]:
+        raw, malformed, timestamp, description, amount = parsed
+        if malformed:
+            return None
+        key = (timestamp, amount, description)
+        occurrence = self._occurrences.get(key, 0)
+        self._occurrences[key] = occurrence + 1
+        return txn_fingerprint(self.source, *key, occurrence)
+
+
+def insert_rows(c: Cursor, dataset_id: int, batch: List[Tuple]) -> int:
+    """
+    Inserts parsed rows with their fingerprints, i.e. (*parse_row(...), fingerprint), as transactions of the dataset,
+    each with a single part covering its whole amount. Rows that were already imported before are skipped; returns
+    how many.
+    """
+    # One indexed lookup for the whole batch.
+    c.execute(
+        "SELECT fingerprint FROM txn WHERE fingerprint IN (SELECT value FROM json_each(?))",
+        (json.dumps([r[-1] for r in batch if r[-1] is not None]),)
+    )
+    existing = {row[0] for row in c.fetchall()}
+    kept = [r for r in batch if r[-1] not in existing] if existing else batch
+
+    c.execute("SELECT IFNULL(MAX(id), 0) FROM txn")
+    last_id = c.fetchone()[0]
+    c.executemany(
+        "INSERT INTO txn (dataset, raw, comment, malformed, timestamp, description, amount, fingerprint)"
+        " VALUES (?, ?, '', ?, ?, ?, ?, ?)",
+        ((dataset_id, *r) for r in kept),
+    )
+    # Every well-formed transaction starts with a single part covering its whole amount. IDs only ever increase, so the
+    # new transactions are those after `last_id`.
+    c.execute(
+        "INSERT INTO txn_part (txn, comment, amount, category)"
+        " SELECT id, '', amount, NULL FROM txn WHERE id > ? AND dataset = ? AND NOT malformed",
+        (last_id, dataset_id)
+    )
+    return len(batch) - len(kept)
@@ -0,0 +1,58 @@
+"""
+Times the parsing of imported rows, comparing the fast paths for timestamps with strptime:
+
+    python -m server.importer_benchmark [rows]
+"""
+
+import random
+import sys
+from calendar import timegm
+from datetime import datetime
+from timeit import timeit
+
+from server.importer import ImportOptions, parse_rows, timestamp_parser
+from server.validation import parse_money_amount
+
+TIMESTAMP_FORMATS = ('%d/%m/%Y', '%Y-%m-%dT%H:%M:%S', '%d %b %Y')
+AMOUNTS = ('-1234.56', '$1234.56', '$1,234.56', '(1,234.56)', ' $ - 1234.56 ')
+
+
+def _ns_per_call(f, values) -> float:
+    return timeit(lambda: [f(v) for v in values], number=1) / len(values) * 1e9
+
+
+def _timestamps(rng: random.Random, fmt: str, n: int):
+    return [datetime.utcfromtimestamp(rng.randint(1420070400, 1600000000)).strftime(fmt) for _ in range(n)]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(1)
+
+    for fmt in TIMESTAMP_FORMATS:
+        values = _timestamps(rng, fmt, rows)
+        strptime = _ns_per_call(lambda raw: timegm(datetime.strptime(raw, fmt).utctimetuple()), values)
+        # Distinct strings, so that the cache doesn't help.
+        uncached = _ns_per_call(timestamp_parser(fmt).__wrapped__, values)
+        print(f'{fmt}: strptime {strptime:.0f} ns, timestamp_parser without cache {uncached:.0f} ns')
+
+    for amount in AMOUNTS:
+        print(f'{amount!r}: {_ns_per_call(parse_money_amount, [amount] * rows):.0f} ns')
+
+    # Like a bank export: a few rows per day, in order.
+    start = 1420070400
+    csv_rows = [
+        [
+            datetime.utcfromtimestamp(start + i // 4 * 86400).strftime('%d/%m/%Y'),
+            f'Shop {rng.randint(1, 500)}',
+            f'{rng.randint(-500000, 500000) / 100:.2f}',
+        ]
+        for i in range(rows)
+    ]
+    opt = ImportOptions(timestamp_column=0, timestamp_format='%d/%m/%Y', description_column=1, amount_column=2)
+    seconds = timeit(lambda: parse_rows(csv_rows, opt), number=1)
+    print(f'parse_rows: {rows / seconds:.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
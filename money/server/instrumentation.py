@@ -0,0 +1,359 @@
+import logging
+import re
+import sqlite3
+from bisect import bisect_left
+from functools import lru_cache
+from os import getenv
+from threading import Lock
+from time import perf_counter
+from typing import Tuple, Dict, List, Iterator, Iterable, Optional
+
+from flask import g, has_request_context, request
+
+# Whether statements and requests are timed, for /_debug/metrics.
+METRICS_ENABLED = getenv('EUCALYPTUS_METRICS', '1') == '1'
+# Statements that take longer than this (in milliseconds) are logged with their query plans. Unset disables the log.
+SLOW_QUERY_MS = getenv('EUCALYPTUS_SLOW_QUERY_MS')
+SLOW_QUERY_SECONDS = None if SLOW_QUERY_MS is None else float(SLOW_QUERY_MS) / 1000
+
+# Rows read at a time when iterating over the rows of a statement.
+ITERATION_BATCH_SIZE = 256
+
+# Upper bounds in seconds of the histograms' buckets.
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_query_log = logging.getLogger('eucalyptus.slow_query')
+
+_WHITESPACE_REGEX = re.compile(r'\s+')
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    labels = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Histogram:
+    """
+    Counts of observed values by the buckets they fall into, per combination of label values, like a Prometheus
+    histogram.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = Lock()
+        # Per bucket (the last one is +Inf) counts that aren't cumulative, followed by the sum of the values.
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted((labels, list(s)) for labels, s in self._series.items())
+        for labels, s in series:
+            count = 0
+            for bound, n in zip((*self.buckets, '+Inf'), s):
+                count += n
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {count}'
+            yield f'{self.name}_sum{_format_labels(self.label_names, labels)} {s[-1]}'
+            yield f'{self.name}_count{_format_labels(self.label_names, labels)} {count}'
+
+
+class Counter:
+    """
+    A total per combination of label values, like a Prometheus counter.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._lock = Lock()
+        self._totals: Dict[Tuple[str, ...], float] = {}
+
+    def add(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            self._totals[labels] = self._totals.get(labels, 0) + value
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            totals = sorted(self._totals.items())
+        for labels, total in totals:
+            yield f'{self.name}{_format_labels(self.label_names, labels)} {total}'
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time taken to produce responses, excluding streamed bodies.',
+    ('route', 'method', 'status'), DURATION_BUCKETS,
+)
+request_db_duration = Histogram(
+    'http_request_db_duration_seconds', 'Part of the time taken to produce responses spent in the database.',
+    ('route', 'method'), DURATION_BUCKETS,
+)
+request_python_duration = Histogram(
+    'http_request_python_duration_seconds',
+    'Part of the time taken to produce responses spent outside of the database (e.g. serialization).',
+    ('route', 'method'), DURATION_BUCKETS,
+)
+statement_duration = Histogram(
+    'sqlite_statement_duration_seconds', 'Time taken to execute statements and read their rows.',
+    ('statement',), DURATION_BUCKETS,
+)
+statement_rows = Counter('sqlite_statement_rows_total', 'Rows returned by statements.', ('statement',))
+
+METRICS = (request_duration, request_db_duration, request_python_duration, statement_duration, statement_rows)
+
+
+def render_metrics() -> str:
+    """
+    The metrics in the Prometheus text format.
+    """
+    return ''.join(line + '\n' for metric in METRICS for line in metric.render())
+
+
+class _RequestTimes:
+    __slots__ = ('db_seconds',)
+
+    def __init__(self):
+        self.db_seconds = 0.0
+
+
+def _request_times() -> Optional[_RequestTimes]:
+    # Statements run by background jobs have no request.
+    return g.get('_metrics') if has_request_context() else None
+
+
+@lru_cache(maxsize=1024)
+def statement_template(sql: str) -> str:
+    # Values are bound as parameters, so the text is the same for every execution of a statement.
+    return _WHITESPACE_REGEX.sub(' ', sql).strip()
+
+
+class _CountingIterable:
+    # Counts the parameter sets of executemany as they're consumed, as they may come from a generator.
+    def __init__(self, params: Iterable):
+        self.params = params
+        self.count = 0
+
+    def __iter__(self):
+        for p in self.params:
+            self.count += 1
+            yield p
+
+
+class _Statement:
+    __slots__ = ('sql', 'params', 'executions', 'seconds', 'rows', 'request')
+
+    def __init__(self, sql: str, params, executions: int, seconds: float, request: Optional[_RequestTimes]):
+        self.sql = sql
+        self.params = params
+        self.executions = executions
+        self.seconds = seconds
+        self.rows = 0
+        self.request = request
+
+    def describe_params(self) -> str:
+        if self.executions != 1:
+            return f'{self.executions} sets of parameters'
+        if isinstance(self.params, dict):
+            return f'{len(self.params)} named parameters'
+        return f'{len(self.params)} parameters'
+
+
+def _explain(db: sqlite3.Connection, statement: _Statement) -> str:
+    if statement.executions != 1:
+        # The parameters of executemany have been consumed.
+        return '  (not explained)'
+    try:
+        # A plain cursor, so that the plan isn't instrumented itself.
+        plan = sqlite3.Cursor(db).execute('EXPLAIN QUERY PLAN ' + statement.sql, statement.params).fetchall()
+    except sqlite3.Error as e:
+        return f'  (no plan: {e})'
+    return '\n'.join(f'  {detail}' for _, _, _, detail in plan)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that times its statements, from their execution until their last row has been read, and counts the rows
+    they return.
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        super().__init__(db)
+        self._statement: Optional[_Statement] = None
+
+    def _finish(self):
+        statement = self._statement
+        if statement is None:
+            return
+        self._statement = None
+        if statement.request is not None:
+            # Only counts towards the request if it's still in progress; streamed rows are read after it has ended.
+            statement.request.db_seconds += statement.seconds
+        template = statement_template(statement.sql)
+        statement_duration.observe((template,), statement.seconds)
+        statement_rows.add((template,), statement.rows)
+        if SLOW_QUERY_SECONDS is not None and statement.seconds >= SLOW_QUERY_SECONDS:
+            slow_query_log.warning(
+                'Slow statement (%.1f ms, %s, %d rows): %s\n%s',
+                statement.seconds * 1000, statement.describe_params(), statement.rows, template,
+                _explain(self.connection, statement),
+            )
+
+    def _fetched(self, start: float, rows: int):
+        statement = self._statement
+        if statement is not None:
+            statement.seconds += perf_counter() - start
+            statement.rows += rows
+
+    def execute(self, sql: str, params=()):
+        self._finish()
+        start = perf_counter()
+        try:
+            super().execute(sql, params)
+        finally:
+            self._statement = _Statement(sql, params, 1, perf_counter() - start, _request_times())
+        if self.description is None:
+            # Not a query, so it has run to completion.
+            self._finish()
+        return self
+
+    def executemany(self, sql: str, params: Iterable):
+        self._finish()
+        counting = _CountingIterable(params)
+        start = perf_counter()
+        try:
+            super().executemany(sql, counting)
+        finally:
+            self._statement = _Statement(sql, None, counting.count, perf_counter() - start, _request_times())
+            self._finish()
+        return self
+
+    def __iter__(self):
+        # Rows are read in batches, as timing each one would slow down reading many rows several times over.
+        while True:
+            start = perf_counter()
+            rows = super().fetchmany(ITERATION_BATCH_SIZE)
+            self._fetched(start, len(rows))
+            if not rows:
+                self._finish()
+                return
+            yield from rows
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size: int = None):
+        start = perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Statements whose rows aren't all read (e.g. with fetchone) are recorded once their cursor is discarded.
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    A connection whose cursors, including those of its execute shortcuts, are instrumented.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, params: Iterable):
+        return self.cursor().executemany(sql, params)
+
+    def commit(self):
+        start = perf_counter()
+        try:
+            super().commit()
+        finally:
+            seconds = perf_counter() - start
+            request_times = _request_times()
+            if request_times is not None:
+                request_times.db_seconds += seconds
+            statement_duration.observe(('COMMIT',), seconds)
+
+
+def connection_factory():
+    """
+    The class of new connections: instrumented if metrics or the slow query log are enabled.
+    """
+    return InstrumentedConnection if METRICS_ENABLED or SLOW_QUERY_SECONDS is not None else sqlite3.Connection
+
+
+def start_request():
+    if not METRICS_ENABLED:
+        return
+    g._metrics_started = perf_counter()
+    g._metrics = _RequestTimes()
+
+
+def note_response(response):
+    g._metrics_status = str(response.status_code)
+    return response
+
+
+def finish_request():
+    """
+    Records the time taken by the current request, and how much of it was spent in the database. Called once its
+    transaction has been committed.
+    """
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return
+    seconds = perf_counter() - started
+    db_seconds = g.pop('_metrics').db_seconds
+    # No status means an error escaped the endpoint.
+    status = g.pop('_metrics_status', '500')
+    rule = request.url_rule
+    route = rule.rule if rule is not None else '(unmatched)'
+    request_duration.observe((route, request.method, status), seconds)
+    request_db_duration.observe((route, request.method), db_seconds)
+    request_python_duration.observe((route, request.method), max(seconds - db_seconds, 0))
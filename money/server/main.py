@@ -2,22 +2,30 @@ from os.path import dirname, realpath, join, abspath
 
 from flask import Flask, g, send_file
 
-from server.api._common import DATABASE
+from server.api._common import DATABASE, release_db, run_after_commit_callbacks
+from server.api.batch import batch_api
 from server.api.category import category_api
 from server.api.dataset import dataset_api
 from server.api.dataset_source import dataset_source_api
+from server.api.debug import debug_api
+from server.api.import_job import import_job_api
+from server.api.rule import rule_api
 from server.api.setting import setting_api
 from server.api.tag import tag_api
 from server.api.transaction import transaction_api
 from server.api.transaction_part import transaction_part_api
 from server.db import prepare_database
+from server.import_jobs import resume_import_jobs
+from server.importer import txn_fingerprint
+from server.instrumentation import start_request, note_response, finish_request
 
 PROJ_DIR = realpath(join(dirname(abspath(__file__)), '..'))
 DATABASE_SCHEMAS_DIR = join(PROJ_DIR, 'db')
 CLIENT_BUILD_DIR = join(PROJ_DIR, 'client', 'build')
 CLIENT_BUILD_PAGE = join(CLIENT_BUILD_DIR, 'index.html')
 
-prepare_database(DATABASE, 'money', DATABASE_SCHEMAS_DIR)
+prepare_database(DATABASE, 'money', DATABASE_SCHEMAS_DIR, functions=[('txn_fingerprint', 5, txn_fingerprint)])
+resume_import_jobs()
 
 server = Flask(
     __name__,
@@ -26,19 +34,35 @@ server = Flask(
 )
 
 
+@server.before_request
+def start_request_metrics():
+    start_request()
+
+
+@server.after_request
+def note_response_metrics(response):
+    return note_response(response)
+
+
+# Teardown functions run in the reverse order of their registration, so this one runs after the commit.
+@server.teardown_request
+def finish_request_metrics(exception):
+    finish_request()
+
+
 @server.teardown_request
 def commit_transaction(exception):
     # TODO Unlock tables
     db = getattr(g, '_database', None)
     if db is not None and not exception:
         db.commit()
+        run_after_commit_callbacks()
 
 
 @server.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    # Uncommitted changes (i.e. from a failed request) are rolled back before the connection is reused.
+    release_db()
     if exception is not None:
         raise exception
 
@@ -48,9 +72,13 @@ def root():
     return send_file(CLIENT_BUILD_PAGE, cache_timeout=0)
 
 
+server.register_blueprint(batch_api)
 server.register_blueprint(category_api)
 server.register_blueprint(dataset_api)
 server.register_blueprint(dataset_source_api)
+server.register_blueprint(debug_api)
+server.register_blueprint(import_job_api)
+server.register_blueprint(rule_api)
 server.register_blueprint(setting_api)
 server.register_blueprint(tag_api)
 server.register_blueprint(transaction_api)
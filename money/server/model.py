@@ -1,17 +1,9 @@
-from operator import itemgetter
+import json
 from sqlite3 import Cursor
-from typing import Callable, Iterable
+from typing import Optional, Tuple, Iterator
 
-from server.sql import Cond, fetch_all_as_dict, Column, Join, JoinMethod, DateTimeColumn, Table
-
-
-def distinct(seq: Iterable, key: Callable):
-    seen = set()
-    for val in seq:
-        k = key(val)
-        if k not in seen:
-            seen.add(k)
-            yield val
+from server.sql import Cond, fetch_all_as_dict, Column, Join, JoinMethod, DateTimeColumn, Table, execute_select, \
+    EpochColumn
 
 
 def fetch_datasets(c: Cursor, where: Cond):
@@ -34,41 +26,80 @@ def fetch_datasets(c: Cursor, where: Cond):
     )
 
 
-def fetch_transactions(c: Cursor, where: Cond, group_by: str):
-    transactions = fetch_all_as_dict(
-        c=c,
-        tables=(
-            Table('txn_part'),
-        ),
+def _transaction_query(
+        where: Cond,
+        group_by: str,
+        order_by: Optional[str],
+        limit: Optional[int],
+        offset: Optional[int],
+        search: bool,
+):
+    if search:
+        # Start from the full-text matches rather than scanning every transaction; `txn_search MATCH ?` and ordering by
+        # `txn_search.rank` are then available to the caller.
+        tables = (
+            Table('txn_search'),
+        )
+        joins = (
+            Join(JoinMethod.inner, Table('txn'), 'txn.id = txn_search.rowid'),
+        )
+    else:
+        # Driven from the transactions, so that ordering and keyset pagination by (timestamp, id) are a range of the
+        # txn_timestamp index rather than a sort of the whole result.
+        tables = (
+            Table('txn'),
+        )
+        joins = ()
+    return dict(
+        tables=tables,
         cols=(
             Column('txn.id', 'id'),
             Column('txn.comment', 'comment'),
             Column('txn.malformed', 'malformed'),
-            DateTimeColumn('txn.timestamp', 'timestamp'),
+            EpochColumn('txn.timestamp', 'timestamp'),
             Column('txn.description', 'description'),
             Column('txn.amount', 'transaction_amount'),
             Column('SUM(txn_part.amount)', 'combined_amount'),
-            Column("GROUP_CONCAT(category.id, '\1')", 'combined_category_ids'),
-            Column("GROUP_CONCAT(category.name, '\1')", 'combined_category_names'),
+            Column(
+                "json_group_array(DISTINCT json_object('id', category.id, 'name', category.name))"
+                " FILTER (WHERE category.id IS NOT NULL)",
+                'combined_categories',
+            ),
         ),
         joins=(
-            Join(JoinMethod.left, Table('txn'), 'txn_part.txn = txn.id'),
+            *joins,
+            Join(JoinMethod.inner, Table('txn_part'), 'txn_part.txn = txn.id'),
             Join(JoinMethod.left, Table('category'), 'txn_part.category = category.id'),
         ),
         where=where,
         group_by=group_by,
+        order_by=order_by,
+        limit=limit,
+        offset=offset,
     )
-    for t in transactions:
-        raw_category_ids = t.pop('combined_category_ids')
-        raw_category_names = t.pop('combined_category_names')
-        if not raw_category_ids:
-            t['combined_categories'] = []
-        else:
-            t['combined_categories'] = list(distinct((
-                {"id": cid, "name": cname}
-                for cid, cname in zip(
-                    map(int, raw_category_ids.split('\1')),
-                    raw_category_names.split('\1'),
-                )
-            ), key=itemgetter('id')))
-    return transactions
+
+
+def select_transaction_rows(
+        c: Cursor,
+        where: Cond,
+        group_by: str,
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        search: bool = False,
+) -> Tuple[Tuple[str, ...], Iterator[Tuple]]:
+    """
+    Returns the field names of transactions and an iterator of transactions as tuples of values in that order.
+    """
+    names = execute_select(c=c, **_transaction_query(where, group_by, order_by, limit, offset, search))
+    # SQLite has already deduplicated the categories and encoded them as a JSON array.
+    return names, ((*row[:-1], json.loads(row[-1])) for row in c)
+
+
+def iter_transactions(c: Cursor, where: Cond, group_by: str, order_by: Optional[str] = None, limit: Optional[int] = None):
+    fields, rows = select_transaction_rows(c, where, group_by, order_by, limit)
+    return (dict(zip(fields, row)) for row in rows)
+
+
+def fetch_transactions(c: Cursor, where: Cond, group_by: str, order_by: Optional[str] = None, limit: Optional[int] = None):
+    return list(iter_transactions(c, where, group_by, order_by, limit))
@@ -0,0 +1,65 @@
+import sqlite3
+import sys
+from sqlite3 import Cursor
+from typing import List, Tuple
+
+from server.api._common import DATABASE
+
+# Queries that compute each rollup table from scratch, in the same column order as the tables.
+ROLLUP_SOURCES = {
+    'txn_rollup_category': """
+        SELECT txn.day, IFNULL(txn_part.category, 0), SUM(txn_part.amount)
+        FROM txn_part, txn
+        WHERE txn_part.amount > 0 AND txn.id = txn_part.txn
+        GROUP BY 1, 2
+    """,
+    'txn_rollup_tag': """
+        SELECT txn.day, txn_part_tag.tag, IFNULL(txn_part.category, 0), SUM(txn_part.amount)
+        FROM txn_part_tag, txn_part, txn
+        WHERE txn_part.id = txn_part_tag.txn_part AND txn_part.amount > 0 AND txn.id = txn_part.txn
+        GROUP BY 1, 2, 3
+    """,
+}
+
+
+def diff_rollup(c: Cursor, table: str) -> List[Tuple]:
+    """
+    Returns (key..., stored amount, expected amount) for every row of a rollup table that does not match a rebuild.
+    Rows with an amount of zero are equivalent to missing rows.
+    """
+    c.execute(f"SELECT * FROM {table} WHERE amount != 0")
+    stored = {row[:-1]: row[-1] for row in c.fetchall()}
+    c.execute(ROLLUP_SOURCES[table])
+    expected = {row[:-1]: row[-1] for row in c.fetchall()}
+    return sorted(
+        (*key, stored.get(key, 0), expected.get(key, 0))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, 0) != expected.get(key, 0)
+    )
+
+
+def rebuild_rollup(c: Cursor, table: str):
+    c.execute(f"DELETE FROM {table}")
+    c.execute(f"INSERT INTO {table} {ROLLUP_SOURCES[table]}")
+
+
+def main(rebuild: bool):
+    db = sqlite3.connect(DATABASE)
+    c = db.cursor()
+    consistent = True
+    for table in ROLLUP_SOURCES:
+        diffs = diff_rollup(c, table)
+        for diff in diffs:
+            print(f"{table}: {diff[:-2]} has {diff[-2]}, expected {diff[-1]}")
+        if diffs:
+            consistent = False
+            if rebuild:
+                print(f"Rebuilding {table}...")
+                rebuild_rollup(c, table)
+    db.commit()
+    return consistent or rebuild
+
+
+if __name__ == '__main__':
+    # Usage: python -m server.rollup [--rebuild]
+    sys.exit(0 if main('--rebuild' in sys.argv[1:]) else 1)
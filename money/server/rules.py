@@ -0,0 +1,212 @@
+import json
+import re
+from collections import deque
+from sqlite3 import Cursor
+from typing import Dict, List, Optional, Sequence, Set
+
+from server.cache import TableCache
+from server.sql import Cond
+
+
+class SubstringMatcher:
+    """
+    Aho–Corasick automaton that finds which of a fixed set of needles occur in a text, in a single pass over the text
+    regardless of how many needles there are.
+    """
+
+    def __init__(self, needles: Sequence[str]):
+        # State 0 is the root. Each state has its transitions, the state to fall back to when no transition matches,
+        # and the indices of the needles that end at it (including those ending at its fallbacks).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for i, needle in enumerate(needles):
+            state = 0
+            for ch in needle:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(i)
+
+        # Breadth-first, so that the fallback of every state has been computed before those of its children.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[int]:
+        """
+        Returns the indices of the needles that occur in `text`.
+        """
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class Rule:
+    __slots__ = (
+        'id', 'comment', 'description_substring', 'description_pattern', 'amount_min', 'amount_max', 'source',
+        'category', 'tags',
+    )
+
+    def __init__(
+            self,
+            id: int,
+            comment: str,
+            description_substring: Optional[str],
+            description_pattern: Optional[str],
+            amount_min: Optional[int],
+            amount_max: Optional[int],
+            source: Optional[int],
+            category: Optional[int],
+            tags: List[int],
+    ):
+        self.id = id
+        self.comment = comment
+        self.description_substring = description_substring
+        self.description_pattern = description_pattern
+        self.amount_min = amount_min
+        self.amount_max = amount_max
+        self.source = source
+        self.category = category
+        self.tags = tags
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RuleSet:
+    """
+    All rules compiled into one matcher. Substring conditions share a single automaton, so a rule with a substring is
+    only considered when its substring occurs; patterns are compiled once and searched only for rules that are still
+    candidates.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        # Ordered by ID, which is also their precedence.
+        self.rules = rules
+        self.by_id: Dict[int, Rule] = {rule.id: rule for rule in rules}
+        self._patterns = [None if r.description_pattern is None else re.compile(r.description_pattern) for r in rules]
+
+        needles: Dict[str, int] = {}
+        # Indices into `rules` of the rules with each needle, and of the rules without one (which must always be checked).
+        self._rules_by_needle: List[List[int]] = []
+        self._unindexed: List[int] = []
+        for i, rule in enumerate(rules):
+            if rule.description_substring is None:
+                self._unindexed.append(i)
+                continue
+            needle = rule.description_substring.lower()
+            if needle not in needles:
+                needles[needle] = len(self._rules_by_needle)
+                self._rules_by_needle.append([])
+            self._rules_by_needle[needles[needle]].append(i)
+        self._matcher = SubstringMatcher(list(needles)) if needles else None
+
+    def _accepts(self, i: int, description: str, amount: int, source: int) -> bool:
+        rule = self.rules[i]
+        if rule.source is not None and rule.source != source:
+            return False
+        if rule.amount_min is not None and amount < rule.amount_min:
+            return False
+        if rule.amount_max is not None and amount > rule.amount_max:
+            return False
+        pattern = self._patterns[i]
+        return pattern is None or pattern.search(description) is not None
+
+    def match(self, description: str, amount: int, source: int) -> Optional[Rule]:
+        """
+        Returns the first rule whose conditions all hold for a transaction, if any.
+        """
+        best = None
+        if self._matcher is not None:
+            candidates = sorted(i for n in self._matcher.find(description.lower()) for i in self._rules_by_needle[n])
+            best = next((i for i in candidates if self._accepts(i, description, amount, source)), None)
+        for i in self._unindexed:
+            if best is not None and i > best:
+                break
+            if self._accepts(i, description, amount, source):
+                best = i
+                break
+        return None if best is None else self.rules[best]
+
+
+def _load_rule_set(c: Cursor) -> RuleSet:
+    c.execute("""
+        SELECT
+            id, comment, description_substring, description_pattern, amount_min, amount_max, source, category,
+            (SELECT json_group_array(tag) FROM rule_tag WHERE rule = rule.id)
+        FROM rule
+        ORDER BY id
+    """)
+    return RuleSet([Rule(*row[:-1], json.loads(row[-1])) for row in c.fetchall()])
+
+
+rule_cache: TableCache[RuleSet] = TableCache(('rule', 'rule_tag'), _load_rule_set)
+
+
+def apply_rules(c: Cursor, rule_set: RuleSet, where: Cond) -> int:
+    """
+    Applies the first matching rule to the uncategorised parts of every well-formed transaction matching `where`, and
+    returns how many transactions matched a rule. Parts that already have a category are left alone.
+    """
+    if not rule_set.rules:
+        return 0
+
+    # Transaction IDs to apply each rule to; matching happens in Python, the writes are then one statement per rule.
+    matched: Dict[int, List[int]] = {}
+    reader = c.connection.cursor()
+    reader.execute(
+        f"""
+            SELECT txn.id, txn.description, txn.amount, dataset.source
+            FROM txn
+            JOIN dataset ON dataset.id = txn.dataset
+            WHERE NOT txn.malformed AND txn.id IN (SELECT txn FROM txn_part WHERE category IS NULL) AND ({where.expr})
+        """,
+        where.params,
+    )
+    for txn_id, description, amount, source in reader:
+        rule = rule_set.match(description, amount, source)
+        if rule is not None:
+            matched.setdefault(rule.id, []).append(txn_id)
+
+    for rule_id, txns in matched.items():
+        rule = rule_set.by_id[rule_id]
+        txns_json = json.dumps(txns)
+        # Tag before categorising, while the parts to tag can still be told apart by their missing category.
+        if rule.tags:
+            c.execute(
+                """
+                    INSERT OR IGNORE INTO txn_part_tag (txn_part, tag, comment)
+                    SELECT txn_part.id, rule_tag.tag, ''
+                    FROM txn_part, rule_tag
+                    WHERE rule_tag.rule = ? AND txn_part.category IS NULL
+                        AND txn_part.txn IN (SELECT value FROM json_each(?))
+                """,
+                (rule.id, txns_json),
+            )
+        if rule.category is not None:
+            c.execute(
+                "UPDATE txn_part SET category = ? WHERE category IS NULL AND txn IN (SELECT value FROM json_each(?))",
+                (rule.category, txns_json),
+            )
+    return sum(len(txns) for txns in matched.values())
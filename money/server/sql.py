@@ -1,11 +1,17 @@
+import json
+import string
+import sys
 from enum import Enum
+from functools import lru_cache
 from sqlite3 import Cursor
-from typing import Optional, List, Tuple, Any, Iterable, Sequence
+from typing import Optional, List, Tuple, Any, Iterable, Sequence, Dict
 
 from werkzeug.exceptions import NotFound
 
 from server.validation import NULL
 
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
 
 class Column:
     def __init__(self, expr: str, alias: Optional[str] = None):
@@ -15,12 +21,27 @@ class Column:
     def name(self):
         return self.alias or self.expr
 
+    def __eq__(self, other):
+        return isinstance(other, Column) and (self.expr, self.alias) == (other.expr, other.alias)
+
+    def __hash__(self):
+        return hash((self.expr, self.alias))
+
 
 class DateTimeColumn(Column):
     def __init__(self, expr: str, alias: Optional[str] = None):
         super().__init__(f"strftime('%s', {expr})", f'_ts:{alias or expr}')
 
 
+class EpochColumn(Column):
+    """
+    Like DateTimeColumn, but for columns that already hold seconds since the epoch.
+    """
+
+    def __init__(self, expr: str, alias: Optional[str] = None):
+        super().__init__(expr, f'_ts:{alias or expr}')
+
+
 class JoinMethod(Enum):
     inner = 'INNER'
     left = 'LEFT'
@@ -35,6 +56,12 @@ class Table:
     def name(self):
         return self.alias or self.table
 
+    def __eq__(self, other):
+        return isinstance(other, Table) and (self.table, self.alias) == (other.table, other.alias)
+
+    def __hash__(self):
+        return hash((self.table, self.alias))
+
 
 class Join:
     def __init__(self, method: JoinMethod, table: Table, on: str):
@@ -42,24 +69,76 @@ class Join:
         self.table = table
         self.on = on
 
+    def __eq__(self, other):
+        return isinstance(other, Join) and (self.method, self.table, self.on) == (other.method, other.table, other.on)
+
+    def __hash__(self):
+        return hash((self.method, self.table, self.on))
+
 
 class Cond:
     def __init__(self, expr: str, *params):
-        self.expr = expr
+        # Conjuncts are only joined into SQL when a statement is compiled, and the tuple of them is part of the
+        # statement cache key.
+        self.exprs = (expr,)
         self.params = params
 
+    @staticmethod
+    def any_of(expr: str, values: Sequence):
+        """
+        Matches `expr IN (...values)`, binding the values as one JSON array so that the SQL text (and therefore the
+        prepared statement) is the same regardless of how many values there are.
+        """
+        return Cond(f'{expr} IN (SELECT value FROM json_each(?))', json.dumps(list(values)))
+
+    @staticmethod
+    def starts_with(expr: str, prefix: str):
+        """
+        Matches values of `expr` that start with `prefix`, ignoring ASCII case, as a range that SQLite can answer from an
+        index on `expr COLLATE NOCASE` (unlike LIKE, which also treats `%` and `_` in the prefix as wildcards).
+        """
+        # NOCASE compares ASCII letters as lower case, so the bounds have to be lower case too.
+        lower = prefix.translate(_ASCII_LOWER)
+        if ord(lower[-1]) == sys.maxunicode:
+            return Cond(f'{expr} COLLATE NOCASE >= ?', lower)
+        following = chr(ord(lower[-1]) + 1)
+        if 'A' <= following <= 'Z':
+            # Upper case letters compare as lower case ones, so the first character after '@' in NOCASE order is '['.
+            following = '['
+        upper = lower[:-1] + following
+        return Cond(f'{expr} COLLATE NOCASE >= ? AND {expr} COLLATE NOCASE < ?', lower, upper)
+
+    @property
+    def expr(self):
+        return ' AND '.join(f'({e})' for e in self.exprs)
+
     def __add__(self, other):
         assert isinstance(other, Cond)
-        return Cond(f'({self.expr}) AND ({other.expr})', (*self.params, *other.params))
+        cond = Cond('TRUE')
+        cond.exprs = (*self.exprs, *other.exprs)
+        cond.params = (*self.params, *other.params)
+        return cond
 
     def __iadd__(self, other):
         assert isinstance(other, Cond)
-        self.expr = f'({self.expr}) AND ({other.expr})'
+        self.exprs += other.exprs
         self.params += other.params
         return self
 
 
-def fetch_all_as_dict(
+def fts_prefix_query(text: str) -> Optional[str]:
+    """
+    Turns free text into an FTS5 query that matches rows containing every word as a prefix of some token. Each word is
+    quoted, so FTS5 syntax in the text (operators, column filters, parentheses) is searched for rather than interpreted.
+    Returns None if the text has no words.
+    """
+    words = text.split()
+    if not words:
+        return None
+    return ' '.join('"{}"*'.format(w.replace('"', '""')) for w in words)
+
+
+def execute_select(
         *,
         c: Cursor,
         tables: Tuple[Table, ...],
@@ -68,19 +147,87 @@ def fetch_all_as_dict(
         where: Cond,
         group_by: Optional[str] = None,
         order_by: Optional[str] = None,
-):
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+) -> Tuple[str, ...]:
+    """
+    Runs the query on `c` and returns the names of the result columns; rows can then be read from `c` as tuples.
+    """
     if type(tables) == str:
         tables = (tables,)
 
-    c.execute(f"""
+    compiled = compile_select(
+        tuple(tables),
+        tuple(cols),
+        tuple(joins),
+        where.exprs,
+        group_by,
+        order_by,
+        limit is not None,
+        offset is not None,
+    )
+    params = where.params
+    if limit is not None:
+        params = (*params, limit)
+    if offset is not None:
+        params = (*params, offset)
+    c.execute(compiled.sql, params)
+    return compiled.names
+
+
+class CompiledSelect:
+    def __init__(self, sql: str, names: Tuple[str, ...]):
+        self.sql = sql
+        # Result column names, in the same order as the values in each row.
+        self.names = names
+
+
+@lru_cache(maxsize=256)
+def compile_select(
+        tables: Tuple[Table, ...],
+        cols: Tuple[Column, ...],
+        joins: Tuple[Join, ...],
+        where: Tuple[str, ...],
+        group_by: Optional[str],
+        order_by: Optional[str],
+        limited: bool,
+        offset: bool,
+) -> CompiledSelect:
+    # All values are bound as parameters, so the same shape of query always produces identical SQL text, which lets
+    # sqlite3 reuse its prepared statement.
+    return CompiledSelect(f"""
         SELECT {', '.join((f"({col.expr})" for col in cols))}
         FROM {','.join(f'{t.table} AS {t.name()}' for t in tables)}
         {' '.join(f'{j.method.value} JOIN {j.table.table} AS {j.table.name()} ON ({j.on})' for j in joins)}
-        WHERE {where.expr}
+        WHERE {' AND '.join(f'({e})' for e in where)}
         {'' if not group_by else f'GROUP BY {group_by}'}
         {'' if not order_by else f'ORDER BY {order_by}'}
-    """, where.params)
-    return [{cols[i].name(): row[i] for i in range(len(cols))} for row in c.fetchall()]
+        {'' if not limited else 'LIMIT ?'}
+        {'' if not offset else ('OFFSET ?' if limited else 'LIMIT -1 OFFSET ?')}
+    """, tuple(col.name() for col in cols))
+
+
+def fetch_all_as_dict(*, c: Cursor, **query):
+    names = execute_select(c=c, **query)
+    return [dict(zip(names, row)) for row in c.fetchall()]
+
+
+def iter_all_as_dict(*, c: Cursor, **query):
+    """
+    Like fetch_all_as_dict, but yields rows straight from the cursor so that memory use does not grow with the result.
+    """
+    names = execute_select(c=c, **query)
+    for row in c:
+        yield dict(zip(names, row))
+
+
+def begin_write(c: Cursor):
+    """
+    Starts a transaction that takes SQLite's write lock immediately, so that rows read to decide on a write cannot be
+    changed by another connection before the write happens.
+    """
+    if not c.connection.in_transaction:
+        c.execute("BEGIN IMMEDIATE")
 
 
 def require_one(rows: List):
@@ -110,3 +257,31 @@ def patch_row(
         tuple(None if val is NULL else val for val in (*(val for _, val in updates), *cond.params))
     )
     return c.rowcount
+
+
+def patch_rows(
+        *,
+        c: Cursor,
+        table: str,
+        rows: Iterable[Tuple[int, Iterable[Tuple[str, Optional[Any]]]]],
+):
+    """
+    Like patch_row for many rows identified by ID, with the same result as patching them in the given order: a row
+    that is given more than once gets the last value given for each column. Rows that end up setting the same columns
+    are updated with a single executemany.
+    """
+    merged: Dict[int, Dict[str, Any]] = {}
+    for row_id, values in rows:
+        updates = merged.setdefault(row_id, {})
+        for col, val in values:
+            if val is not None:
+                updates[col] = val
+    groups: Dict[Tuple[str, ...], List[Tuple]] = {}
+    for row_id, updates in merged.items():
+        if not updates:
+            continue
+        groups.setdefault(tuple(updates), []).append(
+            (*(None if val is NULL else val for val in updates.values()), row_id)
+        )
+    for cols, params in groups.items():
+        c.executemany(f"UPDATE {table} SET {','.join((f'{col} = ?' for col in cols))} WHERE id = ?", params)
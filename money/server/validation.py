@@ -28,7 +28,10 @@ def require_json_object_body():
     return body
 
 
-MONEY_AMOUNT_REGEX = re.compile(r'^\s*\$?\s*(-)?\s*([0-9]+)\.([0-9]{2})\s*$')
+# E.g. "$1,234.56", "-12.00" or "(12.00)", where parentheses mean negative as in accounting.
+MONEY_AMOUNT_REGEX = re.compile(r'^\s*(\()?\s*\$?\s*(-)?\s*([0-9]{1,3}(?:,[0-9]{3})+|[0-9]+)\.([0-9]{2})\s*(\))?\s*$')
+# Subset of the above without inner whitespace, thousands separators or parentheses, which is quicker to match.
+MONEY_AMOUNT_PLAIN_REGEX = re.compile(r'\$?(-?)([0-9]+)\.([0-9]{2})')
 
 
 def parse_bool(raw: str):
@@ -40,11 +43,21 @@ def parse_bool(raw: str):
 
 
 def parse_money_amount(raw: str):
-    try:
-        negative, integer, decimal = MONEY_AMOUNT_REGEX.search(raw).groups()
-        return (int(integer) * 100 + int(decimal)) * (-1 if negative else 1)
-    except (AttributeError, ValueError):
+    # Fast path for plain amounts like "1234.56", "-1234.56" or "$1234.56", which is what most rows have.
+    match = MONEY_AMOUNT_PLAIN_REGEX.fullmatch(raw.strip())
+    if match is not None:
+        negative, integer, decimal = match.groups()
+        cents = int(integer) * 100 + int(decimal)
+        return -cents if negative else cents
+
+    match = MONEY_AMOUNT_REGEX.search(raw)
+    if match is None:
         raise ValueError("Invalid money amount string.")
+    open_paren, negative, integer, decimal, close_paren = match.groups()
+    if (open_paren is None) != (close_paren is None) or (open_paren and negative):
+        raise ValueError("Invalid money amount string.")
+    cents = int(integer.replace(',', '')) * 100 + int(decimal)
+    return -cents if open_paren or negative else cents
 
 
 R = TypeVar('R')
@@ -148,6 +161,7 @@ def boolv(
 def timestampv(
         *,
         parse_from_str: bool = False,
+        as_epoch: bool = False,
 ):
     def validator(val):
         if parse_from_str:
@@ -155,9 +169,11 @@ def timestampv(
         if not isinstance(val, int):
             raise ValueError("is not a timestamp")
         try:
-            return datetime.fromtimestamp(val, tz=timezone.utc)
+            dt = datetime.fromtimestamp(val, tz=timezone.utc)
         except (OverflowError, OSError):
             raise ValueError("is not a valid time")
+        # Timestamps are stored as seconds since the epoch.
+        return val if as_epoch else dt
 
     return validator
 
@@ -171,3 +187,23 @@ def enumv(
             raise ValueError("is not a valid option")
         return val
     return validator
+
+
+def listv():
+    def validator(val):
+        if not isinstance(val, list):
+            raise ValueError("is not a list")
+        return val
+    return validator
+
+
+def patternv():
+    def validator(val):
+        if not isinstance(val, str):
+            raise ValueError("is not a string")
+        try:
+            re.compile(val)
+        except re.error:
+            raise ValueError("is not a valid regular expression")
+        return val
+    return validator
@@ -0,0 +1,70 @@
+import io
+import os
+import sqlite3
+from tempfile import mkdtemp
+
+import pytest
+
+# The database is chosen when the server modules are imported, and is created from the latest db/<version>/create.sql.
+os.environ['EUCALYPTUS_DB'] = os.path.join(mkdtemp(), 'test.sqlite')
+
+from server.api._common import write_connection
+from server.import_jobs import ImportWorker, create_import_job, spool_upload, _run_job
+from server.importer import ImportOptions
+from server.main import server
+
+
+@pytest.fixture(scope='session')
+def client():
+    client = server.test_client()
+    root = client.post('/categories', json={'name': 'root', 'mode': 'root'}).get_json()['id']
+    for name in ('food', 'rent'):
+        client.post('/categories', json={'name': name, 'mode': 'first', 'target': root})
+    for name in ('holiday', 'work'):
+        client.post('/tags', json={'name': name, 'comment': ''})
+
+    db = sqlite3.connect(os.environ['EUCALYPTUS_DB'])
+    db.execute("INSERT INTO dataset_source (name, comment) VALUES ('bank', '')")
+    db.execute("INSERT INTO dataset (source, comment, created) VALUES (1, '', 0)")
+    db.executemany(
+        "INSERT INTO txn (dataset, raw, comment, malformed, timestamp, description, amount) VALUES (1, '', '', 0, ?, ?, ?)",
+        ((1514764800 + i * 43200, f'Shop {i % 7}', (i % 11 - 5) * 100) for i in range(100))
+    )
+    db.execute("INSERT INTO txn_part (txn, comment, amount, category) SELECT id, '', amount, 2 + id % 2 FROM txn")
+    db.execute("INSERT INTO txn_part_tag (txn_part, tag, comment) SELECT id, 1 + id % 2, '' FROM txn_part WHERE id % 3 = 0")
+    db.commit()
+    db.close()
+    return client
+
+
+@pytest.fixture
+def db(client):
+    db = sqlite3.connect(os.environ['EUCALYPTUS_DB'])
+    yield db
+    db.close()
+
+
+def create_import(data: str) -> int:
+    """
+    Creates a dataset of the first source and a job that imports `data`, with day/month/year timestamps, descriptions
+    and amounts in its columns, returning the job's ID. The job isn't submitted to the background worker.
+    """
+    path, size = spool_upload(io.BytesIO(data.encode()))
+    with write_connection() as db:
+        c = db.cursor()
+        c.execute("INSERT INTO dataset (source, comment, created) VALUES (1, '', DATETIME('now'))")
+        job_id = create_import_job(c, c.lastrowid, path, size, ImportOptions(
+            timestamp_column=0,
+            timestamp_format='%d/%m/%Y',
+            description_column=1,
+            amount_column=2,
+        ))
+        db.commit()
+    return job_id
+
+
+def run_import(job_id: int) -> bool:
+    """
+    Runs an import job in this thread, returning whether it's being run by another process instead.
+    """
+    return _run_job(job_id, ImportWorker(1)._parse_batches)
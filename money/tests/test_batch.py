@@ -0,0 +1,53 @@
+import pytest
+
+
+@pytest.fixture
+def transaction(client, db):
+    """
+    The IDs of a new transaction and of its only part.
+    """
+    txn = db.execute(
+        "INSERT INTO txn (dataset, raw, comment, malformed, timestamp, description, amount)"
+        " VALUES (1, '', '', 0, 1600000000, 'Batch', 1000)"
+    ).lastrowid
+    part = db.execute("INSERT INTO txn_part (txn, comment, amount, category) VALUES (?, '', 1000, NULL)", (txn,)).lastrowid
+    db.commit()
+    return txn, part
+
+
+def _batch(client, *operations):
+    res = client.post('/batch', json={'operations': list(operations)})
+    assert res.status_code == 200
+    return [result['status'] for result in res.get_json()['results']]
+
+
+def test_later_updates_of_a_row_win(client, db, transaction):
+    txn, part = transaction
+    statuses = _batch(
+        client,
+        {'op': 'update_transaction', 'transaction': txn, 'comment': 'first'},
+        {'op': 'update_transaction', 'transaction': txn, 'comment': 'second', 'description': 'second'},
+        {'op': 'update_transaction', 'transaction': txn, 'comment': 'third'},
+        {'op': 'update_transaction_part', 'part': part, 'comment': 'first'},
+        {'op': 'update_transaction_part', 'part': part, 'amount': 600, 'comment': 'second'},
+        {'op': 'update_transaction_part', 'part': part, 'comment': 'third'},
+    )
+    assert statuses == [200] * 6
+    assert db.execute("SELECT comment, description FROM txn WHERE id = ?", (txn,)).fetchone() == ('third', 'second')
+    assert db.execute("SELECT comment, amount FROM txn_part WHERE id = ?", (part,)).fetchone() == ('third', 600)
+
+
+def test_operations_after_a_deletion_are_not_found(client, db, transaction):
+    txn, part = transaction
+    statuses = _batch(
+        client,
+        {'op': 'update_transaction_part', 'part': part, 'comment': 'before'},
+        {'op': 'delete_transaction', 'transaction': txn},
+        {'op': 'update_transaction', 'transaction': txn, 'comment': 'after'},
+        {'op': 'create_transaction_part', 'transaction': txn, 'amount': 1},
+        {'op': 'update_transaction_part', 'part': part, 'comment': 'after'},
+        {'op': 'delete_transaction', 'transaction': txn},
+    )
+    assert statuses == [200, 200, 404, 404, 404, 404]
+    assert db.execute("SELECT COUNT(*) FROM txn_part WHERE txn = ?", (txn,)).fetchone() == (0,)
+    assert db.execute("SELECT COUNT(*) FROM txn WHERE id = ?", (txn,)).fetchone() == (0,)
@@ -0,0 +1,36 @@
+from email.utils import formatdate
+
+from server.api import _http_cache
+
+
+def _modified(client) -> int:
+    res = client.get('/tags')
+    assert res.status_code == 200
+    return int(res.last_modified.timestamp()) if res.last_modified is not None else None
+
+
+def test_if_modified_since_is_ignored_within_the_second_of_a_change(client, monkeypatch):
+    assert client.post('/tags', json={'name': 'same second', 'comment': ''}).status_code == 200
+    monkeypatch.setattr(_http_cache, 'time', lambda: 4102444800)
+    modified = _modified(client)
+    assert modified is not None
+
+    # Until the second of the last change is over, another change could have the same time of modification.
+    monkeypatch.setattr(_http_cache, 'time', lambda: modified + 0.5)
+    res = client.get('/tags', headers={'If-Modified-Since': formatdate(modified, usegmt=True)})
+    assert res.status_code == 200
+    assert res.last_modified is None
+    assert res.headers['ETag']
+
+    monkeypatch.setattr(_http_cache, 'time', lambda: modified + 1)
+    res = client.get('/tags', headers={'If-Modified-Since': formatdate(modified, usegmt=True)})
+    assert res.status_code == 304
+
+
+def test_if_none_match_within_the_second_of_a_change(client, monkeypatch):
+    assert client.post('/tags', json={'name': 'etag', 'comment': ''}).status_code == 200
+    monkeypatch.setattr(_http_cache, 'time', lambda: 0)
+    etag = client.get('/tags').headers['ETag']
+    assert client.get('/tags', headers={'If-None-Match': etag}).status_code == 304
+    assert client.post('/tags', json={'name': 'etag 2', 'comment': ''}).status_code == 200
+    assert client.get('/tags', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,110 @@
+import pytest
+
+from server import import_jobs
+from server.api._common import write_connection
+from tests.conftest import create_import, run_import
+
+
+class Crash(BaseException):
+    pass
+
+
+def _csv(name: str, rows: int) -> str:
+    # Descriptions are unique to each test, so that its rows aren't skipped as duplicates of another test's.
+    return ''.join(f'{1 + i % 28:02d}/01/2020,{name} {i},${i}.00\n' if i != 3 else 'not a date,x\n' for i in range(rows))
+
+
+def _job(client, job_id: int):
+    res = client.get(f'/import_job/{job_id}')
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def _count(db, job_id: int) -> int:
+    return db.execute(
+        "SELECT COUNT(*) FROM txn WHERE dataset = (SELECT dataset FROM import_job WHERE id = ?)", (job_id,)
+    ).fetchone()[0]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(import_jobs, 'IMPORT_BATCH_SIZE', 4)
+
+
+def test_import(client, db):
+    job_id = create_import(_csv('import', 10))
+    assert not run_import(job_id)
+    job = _job(client, job_id)
+    assert (job['status'], job['rows'], job['malformed'], job['inserted']) == ('done', 10, 1, 10)
+    assert job['bytes_done'] == job['bytes_total']
+    assert _count(db, job_id) == 10
+
+
+def test_resume_after_crash(client, db, monkeypatch, small_chunks):
+    job_id = create_import(_csv('resume', 10))
+    insert_rows = import_jobs.insert_rows
+    chunks = []
+
+    def crashing(c, dataset_id, batch):
+        chunks.append(batch)
+        if len(chunks) == 2:
+            raise Crash()
+        return insert_rows(c, dataset_id, batch)
+
+    monkeypatch.setattr(import_jobs, 'insert_rows', crashing)
+    with pytest.raises(Crash):
+        run_import(job_id)
+    monkeypatch.setattr(import_jobs, 'insert_rows', insert_rows)
+    job = _job(client, job_id)
+    assert (job['status'], job['rows']) == ('running', 4)
+
+    # Another process, e.g. after a restart, leaves the job alone while the crashed one's lease lasts.
+    monkeypatch.setattr(import_jobs, '_owner', lambda: 'restarted')
+    assert run_import(job_id)
+    assert _job(client, job_id)['rows'] == 4
+
+    now = import_jobs.time()
+    monkeypatch.setattr(import_jobs, 'time', lambda: now + import_jobs.JOB_LEASE_SECONDS + 1)
+    assert not run_import(job_id)
+    job = _job(client, job_id)
+    assert (job['status'], job['rows'], job['malformed'], job['inserted']) == ('done', 10, 1, 10)
+    assert _count(db, job_id) == 10
+
+
+def test_job_is_claimed_by_one_process(client, db, monkeypatch):
+    job_id = create_import(_csv('claim', 5))
+    with write_connection() as conn:
+        assert import_jobs._claim_job(conn, job_id)
+    monkeypatch.setattr(import_jobs, '_owner', lambda: 'other')
+    with write_connection() as conn:
+        assert not import_jobs._claim_job(conn, job_id)
+    assert run_import(job_id)
+    assert _count(db, job_id) == 0
+
+
+def test_cancel_queued(client, db):
+    job_id = create_import(_csv('cancel queued', 5))
+    assert client.post(f'/import_job/{job_id}/cancel').status_code == 200
+    assert not run_import(job_id)
+    job = _job(client, job_id)
+    assert (job['status'], job['rows']) == ('cancelled', 0)
+    assert _count(db, job_id) == 0
+    assert client.post(f'/import_job/{job_id}/cancel').status_code == 400
+
+
+def test_cancel_running(client, db, monkeypatch, small_chunks):
+    job_id = create_import(_csv('cancel running', 10))
+    insert_rows = import_jobs.insert_rows
+
+    def cancelling(c, dataset_id, batch):
+        skipped = insert_rows(c, dataset_id, batch)
+        # As if cancelled by a request while the first chunk was being inserted.
+        c.execute("UPDATE import_job SET status = 'cancelling' WHERE id = ?", (job_id,))
+        return skipped
+
+    monkeypatch.setattr(import_jobs, 'insert_rows', cancelling)
+    assert not run_import(job_id)
+    job = _job(client, job_id)
+    # Chunks committed before the cancellation are kept.
+    assert (job['status'], job['rows']) == ('cancelled', 4)
+    assert _count(db, job_id) == 4
@@ -0,0 +1,162 @@
+import random
+import re
+from calendar import timegm
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from server.importer import timestamp_parser
+from server.validation import parse_money_amount
+
+# Fixed seeds, so that failures can be reproduced.
+SEEDS = range(5)
+CASES = 20000
+
+TIMESTAMP_FORMATS = (
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%Y-%m-%d',
+    '%Y%m%d',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%d.%m.%Y %H:%M:%S',
+    # Not matched without strptime.
+    '%d %b %Y',
+    '%Y-%m-%d %I:%M %p',
+)
+
+
+def _outcome(parse, raw: str):
+    try:
+        return parse(raw)
+    except ValueError:
+        return ValueError
+
+
+def _parse_with_strptime(raw: str, fmt: str) -> int:
+    return timegm(datetime.strptime(raw, fmt).utctimetuple())
+
+
+def _random_field(rng: random.Random, directive: str) -> str:
+    if directive == 'Y':
+        return str(rng.choice((rng.randint(1900, 2100), rng.randint(1, 9999))))
+    if directive == 'b':
+        return rng.choice(('Jan', 'Feb', 'Mar', 'Dec', 'jan', 'Foo'))
+    if directive == 'p':
+        return rng.choice(('AM', 'PM', 'am', 'XM'))
+    # Mostly valid, but also days past the end of the month, hours and minutes out of range, and zero.
+    limit = {'m': 12, 'd': 31, 'H': 23, 'I': 12, 'M': 59, 'S': 59}[directive]
+    value = rng.randint(0, limit + 2) if rng.random() < 0.2 else rng.randint(1, limit)
+    # Usually zero-padded, like most exports, but strptime also accepts single digits.
+    return f'{value:02d}' if rng.random() < 0.8 else str(value)
+
+
+def _random_timestamp(rng: random.Random, fmt: str) -> str:
+    raw = re.sub(r'%(.)', lambda m: _random_field(rng, m.group(1)), fmt)
+    roll = rng.random()
+    if roll < 0.03:
+        return raw + rng.choice(('x', ' ', '0'))
+    if roll < 0.06:
+        i = rng.randrange(len(raw))
+        return raw[:i] + raw[i + 1:]
+    if roll < 0.08:
+        return ' ' + raw
+    return raw
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('fmt', TIMESTAMP_FORMATS)
+def test_timestamp_parser_agrees_with_strptime(fmt, seed):
+    rng = random.Random(seed)
+    parse = timestamp_parser(fmt)
+    for _ in range(CASES // len(TIMESTAMP_FORMATS)):
+        raw = _random_timestamp(rng, fmt)
+        expected = _outcome(lambda r: _parse_with_strptime(r, fmt), raw)
+        assert _outcome(parse, raw) == expected, raw
+        # Again, from the cache.
+        assert _outcome(parse, raw) == expected, raw
+
+
+def _parse_with_decimal(raw: str) -> int:
+    # Reads amounts token by token rather than with the regular expressions of parse_money_amount.
+    s = raw.strip()
+    negative = len(s) > 1 and s[0] == '(' and s[-1] == ')'
+    if negative:
+        s = s[1:-1].strip()
+    if s.startswith('$'):
+        s = s[1:].lstrip()
+    if s.startswith('-'):
+        if negative:
+            raise ValueError('Both parentheses and a minus sign.')
+        negative = True
+        s = s[1:].lstrip()
+    if re.fullmatch(r'([0-9]{1,3}(,[0-9]{3})+|[0-9]+)\.[0-9]{2}', s) is None:
+        raise ValueError('Not an amount.')
+    cents = int(Decimal(s.replace(',', '')) * 100)
+    return -cents if negative else cents
+
+
+def _random_digits(rng: random.Random) -> str:
+    digits = str(rng.choice((rng.randint(0, 999), rng.randint(0, 10 ** 9), rng.randint(0, 10 ** 20))))
+    if rng.random() < 0.1:
+        digits = '0' + digits
+    roll = rng.random()
+    if roll < 0.3:
+        # Thousands separators.
+        return f'{int(digits):,}'
+    if roll < 0.35:
+        # Misplaced separators.
+        i = rng.randrange(len(digits) + 1)
+        return digits[:i] + ',' + digits[i:]
+    return digits
+
+
+def _random_amount(rng: random.Random) -> str:
+    def maybe(s: str, p: float) -> str:
+        return s if rng.random() < p else ''
+
+    def space() -> str:
+        return maybe(rng.choice((' ', '  ', '\t', '\xa0')), 0.1)
+
+    paren = rng.random() < 0.15
+    decimals = rng.choice(('00', '05', '99', '50', '1', '123', ''))
+    raw = (
+        space() + maybe('(', 0.05 if not paren else 1) + space() + maybe('$', 0.3) + space() + maybe('-', 0.3)
+        + space() + _random_digits(rng) + maybe('.', 0.97) + decimals + space()
+        + maybe(')', 0.05 if not paren else 0.95) + space()
+    )
+    if rng.random() < 0.05:
+        i = rng.randrange(len(raw) + 1)
+        raw = raw[:i] + rng.choice('$-.,()x1 ') + raw[i:]
+    return raw
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_parse_money_amount_agrees_with_decimal(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES):
+        raw = _random_amount(rng)
+        assert _outcome(parse_money_amount, raw) == _outcome(_parse_with_decimal, raw), raw
+
+
+@pytest.mark.parametrize('raw, expected', (
+    ('12.34', 1234),
+    ('-12.34', -1234),
+    ('$12.34', 1234),
+    ('$-12.34', -1234),
+    (' $ - 12.34 ', -1234),
+    ('1,234,567.89', 123456789),
+    ('(1,234.50)', -123450),
+    ('( $12.00 )', -1200),
+    ('12.3', ValueError),
+    ('12', ValueError),
+    ('1,23.00', ValueError),
+    ('-$12.00', ValueError),
+    ('(-12.00)', ValueError),
+    ('(12.00', ValueError),
+    ('12.00)', ValueError),
+    ('', ValueError),
+))
+def test_parse_money_amount(raw, expected):
+    assert _outcome(parse_money_amount, raw) == expected
@@ -0,0 +1,74 @@
+import re
+from typing import List
+
+import pytest
+
+from server import analytics, instrumentation
+
+# Statements on the transactions that are run by the listing, export and analysis endpoints. Their plans must find the
+# rows through an index: a scan of txn or txn_part reads every transaction however few are requested, and a sort for
+# ORDER BY reads every matching one before the first is returned.
+QUERIES = (
+    '/transactions?limit=50',
+    '/transactions?limit=50&after=1515000000_10',
+    '/transactions?limit=50&from=1515000000&to=1516000000',
+    '/transactions?limit=50&dataset=1',
+    '/transactions?limit=50&dataset=1&after=1515000000_10',
+    '/transactions?limit=50&category=2',
+    '/transactions?limit=50&category_subtree=1',
+    '/transactions?limit=50&tag=1',
+    '/transactions?limit=50&tag=1&tag=2',
+    '/transactions?limit=50&stream=rows',
+    '/transactions?limit=50&q=shop',
+    '/transactions?limit=50&q=shop&dataset=1',
+    '/transactions/export?format=csv',
+    '/transactions/export?format=csv&dataset=1&from=1515000000',
+    '/transactions/analysis?split_by=category&time_unit=month',
+    '/transactions/analysis?split_by=category_tree&time_unit=none&from=1515000000',
+    '/transactions/analysis?split_by=none&time_unit=day&tag=1',
+    '/transactions/analysis?split_by=category&time_unit=year&tag=1&tag=2',
+    '/transaction/10/parts',
+)
+
+# Listings of every transaction read them in the order of the timestamp index, which stops once the page is full.
+ALLOWED_SCANS = {'SCAN txn USING INDEX txn_timestamp', 'SCAN txn USING COVERING INDEX txn_timestamp'}
+
+_TABLE_SCAN = re.compile(r'\bSCAN (txn|txn_part)\b')
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    """
+    The query plans of the statements on transactions run by requests, taken by the slow query log.
+    """
+    captured: List[List[str]] = []
+    explain = instrumentation._explain
+
+    def capture(db, statement):
+        plan = explain(db, statement)
+        if re.search(r'\btxn', statement.sql) and 'data_version' not in statement.sql:
+            captured.append([line.strip() for line in plan.splitlines()])
+        return plan
+
+    monkeypatch.setattr(instrumentation, '_explain', capture)
+    monkeypatch.setattr(instrumentation, 'SLOW_QUERY_SECONDS', 0)
+    monkeypatch.setattr(instrumentation.slow_query_log, 'disabled', True)
+    # The SQL queries are what's being checked, not the in-memory engine that can replace some of them.
+    monkeypatch.setattr(analytics, 'engine', None)
+    return captured
+
+
+@pytest.mark.parametrize('url', QUERIES)
+def test_hot_queries_use_indexes(client, plans, url):
+    res = client.get(url)
+    assert res.status_code == 200
+    res.get_data()
+    res.close()
+
+    assert plans, 'no statements on transactions were run'
+    for plan in plans:
+        scans = [line for line in plan if _TABLE_SCAN.search(line) and line not in ALLOWED_SCANS]
+        assert not scans, '\n'.join(plan)
+        if 'q=' not in url:
+            # Search results are ordered by relevance, which no index provides.
+            assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, '\n'.join(plan)
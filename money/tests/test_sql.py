@@ -0,0 +1,23 @@
+import random
+import sqlite3
+
+import pytest
+
+from server.sql import Cond
+
+# Around the ASCII letters, whose case NOCASE ignores.
+ALPHABET = '?@AZ[\\_`az{~'
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_starts_with_matches_prefixes_ignoring_ascii_case(seed):
+    rng = random.Random(seed)
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE t (name TEXT)")
+    names = {''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 4))) for _ in range(500)}
+    db.executemany("INSERT INTO t VALUES (?)", ((name,) for name in names))
+    for _ in range(200):
+        prefix = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 3)))
+        cond = Cond.starts_with('name', prefix)
+        matched = {name for name, in db.execute(f"SELECT name FROM t WHERE {cond.expr}", cond.params)}
+        assert matched == {name for name in names if name.lower().startswith(prefix.lower())}, prefix
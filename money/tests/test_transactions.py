@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def dataset(client, db):
+    """
+    A new dataset of transactions, some with the same timestamp, and their IDs in (timestamp, id) order.
+    """
+    dataset = db.execute("INSERT INTO dataset (source, comment, created) VALUES (1, '', 0)").lastrowid
+    ids = [
+        db.execute(
+            "INSERT INTO txn (dataset, raw, comment, malformed, timestamp, description, amount)"
+            " VALUES (?, '', '', 0, ?, 'Page', 100)",
+            (dataset, 1590000000 + i // 2 * 86400)
+        ).lastrowid
+        for i in range(10)
+    ]
+    db.execute("INSERT INTO txn_part (txn, comment, amount, category) SELECT id, '', 100, NULL FROM txn WHERE dataset = ?",
+               (dataset,))
+    db.commit()
+    return dataset, ids
+
+
+def _pages(client, url: str):
+    res = client.get(url)
+    assert res.status_code == 200
+    page = res.get_json()
+    yield page
+    while page['next'] is not None:
+        res = client.get(f"{url}&after={page['next']}")
+        assert res.status_code == 200
+        page = res.get_json()
+        yield page
+
+
+@pytest.mark.parametrize('stream', ('', '&stream=json', '&stream=rows'))
+def test_pages_cover_every_transaction_in_order(client, dataset, stream):
+    dataset, ids = dataset
+    seen = []
+    for page in _pages(client, f'/transactions?dataset={dataset}&limit=3{stream}'):
+        if stream == '&stream=rows':
+            index = page['fields'].index('id')
+            seen += [row[index] for row in page['transactions']]
+        else:
+            seen += [t['id'] for t in page['transactions']]
+    assert seen == ids
+
+
+def test_pages_continue_after_a_deleted_transaction(client, db, dataset):
+    dataset, ids = dataset
+    page = client.get(f'/transactions?dataset={dataset}&limit=3').get_json()
+    assert client.delete(f"/transaction/{page['transactions'][-1]['id']}").status_code == 200
+    page = client.get(f"/transactions?dataset={dataset}&limit=3&after={page['next']}").get_json()
+    assert [t['id'] for t in page['transactions']] == ids[3:6]
+
+
+@pytest.mark.parametrize('after', ('12', '1_2_3', 'a_1', ''))
+def test_malformed_page_cursor(client, after):
+    assert client.get(f'/transactions?after={after}').status_code == 400